@@ -20,9 +20,26 @@ def create_app(config_class=Config):
 
     compress.init_app(app)
     db.init_app(app)
+
+    from app.metrics import metrics
+
+    metrics.init_app(app, db)
     limiter.init_app(app)
     migrate.init_app(app, db)
 
+    from app.cache import cache
+    from app.instrumentation import instrumentation
+
+    cache.init_app(app)
+    instrumentation.init_app(app)
+
+    @app.after_request
+    def compress_response(response):
+        # Compressing a streamed response would buffer the whole body in memory first
+        if response.is_streamed:
+            return response
+        return compress.after_request(response)
+
     # Register blueprints
     from app.grade import grade
     from app.location import location
@@ -33,17 +50,19 @@ def create_app(config_class=Config):
     from app.programme import programme
     from app.project import project
     from app.role import role
+    from app.search import search
     from app.team import team
 
     app.register_blueprint(grade, url_prefix="/v1/organisations")
     app.register_blueprint(location, url_prefix="/v1/organisations")
     app.register_blueprint(main)
-    app.register_blueprint(organisation, url_prefix="/v1/organisations")
+    app.register_blueprint(organisation, url_prefix="/v1")
     app.register_blueprint(person, url_prefix="/v1/organisations")
     app.register_blueprint(practice, url_prefix="/v1/organisations")
     app.register_blueprint(programme, url_prefix="/v1/organisations")
     app.register_blueprint(project, url_prefix="/v1/organisations")
     app.register_blueprint(role, url_prefix="/v1/organisations")
+    app.register_blueprint(search, url_prefix="/v1/organisations")
     app.register_blueprint(team, url_prefix="/v1/organisations")
 
     stream_handler = logging.StreamHandler()
@@ -0,0 +1,197 @@
+import uuid
+
+from app import db
+from app.includes import included
+from app.projections import load
+from app.schemas import validate, validators
+from app.serializers import dumps, loads
+from flask import Response, current_app, request
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from werkzeug.exceptions import BadRequest, NotAcceptable, RequestEntityTooLarge
+
+
+class InvalidItems(BadRequest):
+    """One or more items in a batch request are invalid, reported individually by their index in the batch."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} of the items in the batch are invalid.")
+        self.errors = errors
+
+
+def ndjson_items():
+    """Parse each non-blank line of a newline delimited JSON request body as an item.
+
+    Lines that aren't valid JSON are kept as None, with an error for each by its index in the batch.
+    """
+    items = []
+    errors = []
+    for line in request.get_data(as_text=True).splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(loads(line))
+        except ValueError:
+            errors.append({"index": len(items), "description": "Invalid JSON."})
+            items.append(None)
+
+    return items, errors
+
+
+def request_items():
+    """Get the items in a batch request, given as a JSON array or as newline delimited JSON, with an error for each
+    that couldn't be parsed.
+    """
+    if request.mimetype == "application/x-ndjson":
+        return ndjson_items()
+
+    items = request.json
+    if not isinstance(items, list):
+        raise BadRequest("Request body must be a JSON array.")
+
+    return items, []
+
+
+def invalid_items(items, schema_name, skipped):
+    """Validate each item against a schema, other than those skipped, returning an error for each that is invalid."""
+    errors = []
+    for index, item in enumerate(items):
+        if index in skipped:
+            continue
+        error = best_match(validators[schema_name].iter_errors(item))
+        if error is not None:
+            errors.append({"index": index, "description": error.message})
+
+    return errors
+
+
+def batch_items(schema_name):
+    """Get the items in a batch request, given as a JSON array or as newline delimited JSON, validated against a schema.
+
+    Every item is checked before any are created, so that all the errors in the batch are reported at once.
+    """
+    items, errors = request_items()
+
+    if not items:
+        raise BadRequest("Batch must contain at least one item.")
+    if len(items) > current_app.config["BATCH_MAX_ITEMS"]:
+        raise RequestEntityTooLarge(f"Batch must contain at most {current_app.config['BATCH_MAX_ITEMS']} items.")
+
+    errors += invalid_items(items, schema_name, {error["index"] for error in errors})
+    if errors:
+        raise InvalidItems(sorted(errors, key=lambda error: error["index"]))
+
+    return items
+
+
+def build(items, factory):
+    """Build a model instance from each item, normalised by the model's constructor."""
+    instances = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            instances.append(factory(item))
+        except (AttributeError, TypeError, ValueError) as e:
+            errors.append({"index": index, "description": str(e)})
+
+    if errors:
+        raise InvalidItems(errors)
+
+    return instances
+
+
+def check_unique(model, instances):
+    """Report items that would break a unique constraint, either within the batch or with existing rows."""
+    errors = []
+    for column in model.__table__.columns:
+        if not column.unique:
+            continue
+
+        values = [getattr(instance, column.key) for instance in instances]
+        existing = {value for (value,) in db.session.query(column).filter(column == func.any(values)).distinct()}
+        seen = set()
+        for index, value in enumerate(values):
+            if value in existing or value in seen:
+                errors.append({"index": index, "description": f"{column.key} must be unique."})
+            seen.add(value)
+
+    if errors:
+        raise InvalidItems(sorted(errors, key=lambda error: error["index"]))
+
+
+def insert_all(model, instances):
+    """Insert model instances with multi-row INSERT ... RETURNING statements, rather than one statement per row.
+
+    Columns with a server default are left for the database to fill in.
+    """
+    columns = [column for column in model.__table__.columns if column.server_default is None]
+    rows = [{column.key: getattr(instance, column.key) for column in columns} for instance in instances]
+
+    ids = []
+    size = current_app.config["BATCH_INSERT_SIZE"]
+    for start in range(0, len(rows), size):
+        statement = insert(model).values(rows[start : start + size]).returning(model.id)
+        ids.extend(db.session.execute(statement).scalars())
+
+    return ids
+
+
+def created(ids):
+    """Build the compact response for a batch of created resources."""
+    return Response(
+        dumps({"count": len(ids), "ids": ids}),
+        mimetype="application/json",
+        status=201,
+    )
+
+
+def requested_ids():
+    """Get the IDs a client asked for, in the ids query parameter or the body of a batch get, or None if it didn't ask.
+
+    IDs are normalised, and any repeats dropped, so that they can be matched against rows in the order they were given.
+    """
+    if request.method == "POST":
+        try:
+            validate(request.json, "BatchGetRequest")
+        except ValidationError as e:
+            raise BadRequest(e.message)
+        ids = request.json["ids"]
+    else:
+        ids = request.args.get("ids", type=str)
+        if ids is None:
+            return None
+        ids = ids.split(",")
+
+    if len(ids) > current_app.config["BATCH_GET_MAX_IDS"]:
+        raise RequestEntityTooLarge(f"ids must contain at most {current_app.config['BATCH_GET_MAX_IDS']} IDs.")
+
+    try:
+        return [*dict.fromkeys(str(uuid.UUID(id)) for id in ids)]
+    except ValueError:
+        raise BadRequest("ids must be UUIDs.")
+
+
+def by_ids(query, item, ids, fields, includes):
+    """Respond with the list items for the rows of a query with any of the IDs, in the order they were asked for, along
+    with the IDs that weren't found. The rows are read with a single query.
+
+    There is no CSV form of the response, so a request that only accepts CSV isn't acceptable.
+    """
+    accept = request.headers.getlist("accept")
+    if "text/csv" in accept and "application/json" not in accept:
+        raise NotAcceptable("A batch of items by ID can only be returned as JSON.")
+
+    matches = item.model.id == func.any(db.bindparam("ids", ids, type_=ARRAY(UUID)))
+    rows = {row.id: row for row in load(query.filter(matches), item, fields, includes) or []}
+    found = [rows[id] for id in ids if id in rows]
+
+    document = {
+        "data": [row.list_item(fields) for row in found],
+        "missing": [id for id in ids if id not in rows],
+    }
+    if includes is not None:
+        document["included"] = included(found, item.model, includes)
+
+    return Response(dumps(document), mimetype="application/json", status=200)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+import redis
+from app.conditional import request_etags
+from app.serializers import dumps, loads
+from flask import Response, current_app, request
+from werkzeug.http import parse_date, unquote_etag
+
+# Response headers worth keeping with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+class LRUStore(object):
+    """In-process store for cached responses, used when Redis isn't available."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def generations(self, namespaces):
+        with self.lock:
+            return [self.tokens.setdefault(namespace, uuid.uuid4().hex) for namespace in namespaces]
+
+    def invalidate(self, namespaces):
+        with self.lock:
+            for namespace in namespaces:
+                self.tokens[namespace] = uuid.uuid4().hex
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class RedisStore(object):
+    """Redis store for cached responses, shared by every worker."""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def generations(self, namespaces):
+        keys = [f"cache:generation:{namespace}" for namespace in namespaces]
+        tokens = self.client.mget(keys)
+        for index, token in enumerate(tokens):
+            if token is None:
+                # First use, or evicted. A fresh random token can never match an old entry.
+                self.client.set(keys[index], uuid.uuid4().hex, nx=True)
+                tokens[index] = self.client.get(keys[index])
+        return [token.decode() for token in tokens]
+
+    def invalidate(self, namespaces):
+        pipeline = self.client.pipeline(transaction=False)
+        for namespace in namespaces:
+            pipeline.set(f"cache:generation:{namespace}", uuid.uuid4().hex)
+        pipeline.execute()
+
+    def get(self, key):
+        value = self.client.get(f"cache:response:{key}")
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(f"cache:response:{key}", value, ex=timeout)
+
+
+class ResponseCache(object):
+    """Shared cache for JSON responses of GET views.
+
+    Cached responses are keyed by the generations of the resources they were rendered from, per organisation. A write
+    invalidates a resource by starting a new generation, so every response that embeds it, however indirectly, stops
+    matching at once.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", False)
+        app.config.setdefault("RESPONSE_CACHE_STORAGE_URL", None)
+        app.config.setdefault("RESPONSE_CACHE_TIMEOUT", 300)
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+
+        if not app.config["RESPONSE_CACHE_ENABLED"]:
+            self.store = None
+        elif app.config["RESPONSE_CACHE_STORAGE_URL"]:
+            self.store = RedisStore(app.config["RESPONSE_CACHE_STORAGE_URL"])
+        else:
+            self.store = LRUStore(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+
+    @staticmethod
+    def namespaces(organisation_id, resources):
+        if organisation_id is None:
+            return list(resources)
+        return [f"{organisation_id}:{resource}" for resource in resources]
+
+    def invalidate(self, organisation_id, *resources):
+        """Invalidate every cached response that depends on any of the resources in an organisation."""
+        if self.store is not None:
+            self.store.invalidate(self.namespaces(organisation_id, resources))
+
+    def cached(self, *resources):
+        """Cache successful JSON responses of a GET view for as long as the resources they depend on are unchanged."""
+
+        def decorator(view):
+            @wraps(view)
+            def decorated_view(*args, **kwargs):
+                if self.store is None:
+                    return view(*args, **kwargs)
+
+                namespaces = self.namespaces(kwargs.get("organisation_id"), resources)
+                generations = self.store.generations(namespaces)
+                key = hashlib.sha256(
+                    json.dumps([request.full_path, request.headers.getlist("accept"), generations]).encode()
+                ).hexdigest()
+
+                entry = self.store.get(key)
+                if entry is not None:
+                    return self.cached_response(loads(entry))
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.mimetype == "application/json":
+                    entry = {
+                        "body": response.get_data(as_text=True),
+                        "headers": [
+                            (name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers
+                        ],
+                    }
+                    self.store.set(key, dumps(entry), current_app.config["RESPONSE_CACHE_TIMEOUT"])
+                response.headers["X-Cache"] = "MISS"
+
+                return response
+
+            return decorated_view
+
+        return decorator
+
+    @staticmethod
+    def cached_response(entry):
+        """Answer a request from a cached entry, with a 304 if the client's copy is still current, as conditional()
+        would have.
+        """
+        headers = dict(entry["headers"])
+        if request.if_none_match:
+            etag, _ = unquote_etag(headers.get("ETag"))
+            fresh = request.if_none_match.star_tag or etag in request_etags(request.if_none_match)
+        elif request.if_modified_since and "Last-Modified" in headers:
+            fresh = parse_date(headers["Last-Modified"]) <= request.if_modified_since
+        else:
+            fresh = False
+
+        if fresh:
+            return Response(status=304, headers={**headers, "X-Cache": "HIT"})
+
+        response = Response(entry["body"], status=200, headers=headers)
+        response.headers["X-Cache"] = "HIT"
+
+        return response
+
+
+cache = ResponseCache()
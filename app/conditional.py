@@ -0,0 +1,211 @@
+import hashlib
+from datetime import datetime
+
+from app import db
+from app.models import Grade, Location, Organisation, Person, Practice, Programme, Project, Role
+from flask import Response, request
+from sqlalchemy import delete, exists, update
+from werkzeug.exceptions import Conflict, NotFound, PreconditionFailed
+
+# Other rows that each model's representation shows fields of, by the field they're shown in, as the joins that reach
+# them from a row of the model
+EMBEDDED = {
+    Location: {"organisation": ((Organisation, Location.organisation_id == Organisation.id),)},
+    Grade: {"organisation": ((Organisation, Grade.organisation_id == Organisation.id),)},
+    Practice: {
+        "head": ((Person, Practice.head_id == Person.id),),
+        "organisation": ((Organisation, Practice.organisation_id == Organisation.id),),
+    },
+    Role: {
+        "grade": ((Grade, Role.grade_id == Grade.id),),
+        "practice": ((Practice, Role.practice_id == Practice.id), (Person, Practice.head_id == Person.id)),
+        "organisation": ((Organisation, Role.organisation_id == Organisation.id),),
+    },
+    Person: {
+        "organisation": ((Organisation, Person.organisation_id == Organisation.id),),
+        "role": (
+            (Role, Person.role_id == Role.id),
+            (Grade, Role.grade_id == Grade.id),
+            (Practice, Role.practice_id == Practice.id),
+        ),
+        "location": ((Location, Person.location_id == Location.id),),
+    },
+    Programme: {
+        "manager": ((Person, Programme.manager_id == Person.id),),
+        "organisation": ((Organisation, Programme.organisation_id == Organisation.id),),
+    },
+    Project: {
+        "manager": ((Person, Project.manager_id == Person.id),),
+        "programme": ((Programme, Project.programme_id == Programme.id),),
+        "organisation": ((Organisation, Project.organisation_id == Organisation.id),),
+    },
+}
+
+# Counts of other rows that each model's representation shows, by field
+COUNTS = {
+    Organisation: {
+        "grades": Organisation.grade_count,
+        "locations": Organisation.location_count,
+        "people": Organisation.person_count,
+        "practices": Organisation.practice_count,
+        "programmes": Organisation.programme_count,
+        "projects": Organisation.project_count,
+        "roles": Organisation.role_count,
+    },
+    Location: {"people": Location.person_count},
+    Grade: {"roles": Grade.role_count},
+    Practice: {"roles": Practice.role_count},
+    Role: {"people": Role.person_count},
+    Programme: {"projects": Programme.project_count},
+}
+
+
+def request_etags(etags, include_weak=True):
+    """Get the entity tags from an If-Match or If-None-Match header.
+
+    Any content coding suffix added by flask-compress (e.g. "abc:gzip") is removed, because a tag identifies the row
+    version whichever encoding the representation was sent with.
+    """
+    return {tag.split(":")[0] for tag in etags.as_set(include_weak=include_weak)}
+
+
+def row_version(model, id, fields=None):
+    """Get the ETag and Last-Modified time of a row's representation, without loading the row or its relationships.
+
+    Both are read in one query, with the versions of the rows the requested fields show and the counts they show. The
+    ETag starts with the row's own version, which is what If-Match is checked against, followed by a digest of the
+    rest if there is any. Counts change without any row being modified, so there is no Last-Modified time if the
+    representation shows any.
+    """
+    joins = {}
+    for field, path in EMBEDDED.get(model, {}).items():
+        if fields is None or field in fields:
+            joins.update((target, onclause) for target, onclause in path if target not in joins)
+    counts = [count for field, count in COUNTS.get(model, {}).items() if fields is None or field in fields]
+
+    timestamps = [column for row in (model, *joins) for column in (row.created_at, row.updated_at)]
+    query = db.session.query(
+        model.version, *[target.version for target in joins], *counts, db.func.greatest(*timestamps)
+    )
+    for target, onclause in joins.items():
+        query = query.outerjoin(target, onclause)
+    row = query.filter(model.id == id).first()
+    if row is None:
+        raise NotFound
+
+    version, *embedded, last_modified = row
+    etag = str(version)
+    if embedded:
+        etag += "-" + hashlib.sha256(repr(tuple(embedded)).encode()).hexdigest()[:16]
+
+    return etag, None if counts else last_modified
+
+
+def conditional(model, id, fields=None, validators=True):
+    """Answer a conditional GET for a single resource from the versions of the rows its representation shows.
+
+    Returns a 304 response if the client's copy is still current. Otherwise returns an empty 200 response carrying the
+    validators, for the caller to fill in with the representation.
+
+    A representation that includes other resources can change while the row doesn't, so without validators the
+    response is always a 200 and carries none, leaving the caller to find that the row doesn't exist.
+    """
+    if not validators:
+        return Response(mimetype="application/json", status=200)
+
+    etag, last_modified = row_version(model, id, fields)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.star_tag or etag in request_etags(request.if_none_match)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+
+    response = Response(mimetype="application/json", status=304 if fresh else 200)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    return response
+
+
+def precondition(model):
+    """Get the criteria matching the row versions given in the request's If-Match header, if there is one.
+
+    Only the row's own version, at the start of each strong tag, is compared. A write doesn't change the rows it shows.
+    Weak tags never match, as If-Match uses the strong comparison.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return []
+
+    versions = [tag.split("-")[0] for tag in request_etags(request.if_match, include_weak=False)]
+
+    return [model.version.in_([int(version) for version in versions if version.isdigit()])]
+
+
+def missing(model, id, required=()):
+    """Raise the right error for a conditional write that matched no rows.
+
+    A delete also matches no rows while other rows still need the row, in any of the required columns that refer to it.
+    """
+    if db.session.query(model.id).filter(model.id == id).first() is None:
+        raise NotFound
+    if any(db.session.query(exists().where(column == id)).scalar() for column in required):
+        raise Conflict(f"The {model.__name__.lower()} can't be deleted while other resources refer to it.")
+    raise PreconditionFailed
+
+
+def references(model):
+    """Get the columns of other tables that refer to rows of a model, as those that can be NULL and those that can't."""
+    columns = [
+        foreign_key.parent
+        for table in db.metadata.tables.values()
+        for foreign_key in table.foreign_keys
+        if foreign_key.column.table is model.__table__
+    ]
+
+    return [column for column in columns if column.nullable], [column for column in columns if not column.nullable]
+
+
+def update_row(model, id, values):
+    """Update a row with a single UPDATE ... RETURNING statement, subject to any If-Match precondition.
+
+    Returns the updated instance, built from the returned columns rather than read before the write.
+    """
+    statement = (
+        update(model)
+        .where(model.id == id, *precondition(model))
+        .values(version=model.version + 1, **values)
+        .returning(*model.__table__.columns)
+    )
+    instance = db.session.execute(db.select(model).from_statement(statement)).scalars().first()
+    if instance is None:
+        missing(model, id)
+
+    return instance
+
+
+def delete_row(model, id):
+    """Delete a row with a single DELETE statement, subject to any If-Match precondition.
+
+    Rows that refer to it are dealt with first, in the same transaction, as the ORM would if the instance were deleted:
+    references that can be NULL are set to NULL, bumping the versions of their rows, and the row isn't deleted while
+    any references that can't be NULL remain. The database's own ON DELETE rules are never relied on.
+    """
+    nullable, required = references(model)
+    for column in nullable:
+        table = column.table
+        db.session.execute(
+            update(table)
+            .where(column == id)
+            .values({column: None, table.c.version: table.c.version + 1, table.c.updated_at: datetime.utcnow()})
+        )
+
+    result = db.session.execute(
+        delete(model)
+        .where(model.id == id, *precondition(model), *[~exists().where(column == id) for column in required])
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        missing(model, id, required)
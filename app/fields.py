@@ -0,0 +1,85 @@
+from flask import request
+from sqlalchemy.orm import undefer_group
+from werkzeug.exceptions import BadRequest
+
+
+# The top-level fields of each representation, as output by the models' as_dict() and the list items' list_item()
+FIELDS = {
+    "Organisation": (
+        "id",
+        "name",
+        "domain",
+        "grades",
+        "locations",
+        "people",
+        "practices",
+        "programmes",
+        "projects",
+        "roles",
+        "created_at",
+        "updated_at",
+    ),
+    "OrganisationItem": ("id", "name", "domain"),
+    "Location": ("id", "name", "address", "organisation", "people", "created_at", "updated_at"),
+    "LocationItem": ("id", "name"),
+    "Grade": ("id", "name", "organisation", "roles", "created_at", "updated_at"),
+    "GradeItem": ("id", "name"),
+    "Practice": ("id", "name", "head", "cost_centre", "organisation", "roles", "created_at", "updated_at"),
+    "PracticeItem": ("id", "name", "head"),
+    "Role": ("id", "title", "grade", "practice", "organisation", "people", "created_at", "updated_at"),
+    "RoleItem": ("id", "title", "grade", "practice"),
+    "Person": (
+        "id",
+        "name",
+        "email_address",
+        "role",
+        "organisation",
+        "employment",
+        "full_time_equivalent",
+        "location",
+        "created_at",
+        "updated_at",
+    ),
+    "PersonItem": ("id", "name", "role", "location"),
+    "Programme": ("id", "name", "manager", "organisation", "projects", "created_at", "updated_at"),
+    "ProgrammeItem": ("id", "name", "manager"),
+    "Project": ("id", "name", "manager", "programme", "status", "organisation", "created_at", "updated_at"),
+    "ProjectItem": ("id", "name", "manager", "programme", "status"),
+}
+
+
+def requested_fields(representation):
+    """Get the fields a client asked for in the fields query parameter, or None if it wants all of them.
+
+    Fields are the top-level keys of the representation, which can be fewer than the properties of its schema.
+    """
+    fields = request.args.get("fields", type=str)
+    if fields is None:
+        return None
+
+    names = fields.split(",")
+    if not all(name in FIELDS[representation] for name in names):
+        raise BadRequest(f"fields must be a comma-separated list of {', '.join(FIELDS[representation])}.")
+
+    return frozenset(names)
+
+
+def sparse(representation, fields):
+    """Pick the requested fields of a representation.
+
+    Values that are expensive to get, such as relationships and deferred counts, can be given as callables, which are
+    only called for the fields that are picked.
+    """
+    return {
+        name: value() if callable(value) else value
+        for name, value in representation.items()
+        if fields is None or name in fields
+    }
+
+
+def counts(fields):
+    """Loader options for the deferred child counts of a representation.
+
+    They are loaded along with its row when every field is wanted. Otherwise they are only loaded if a count is used.
+    """
+    return [undefer_group("counts")] if fields is None else []
@@ -0,0 +1,29 @@
+from flask import request
+from sqlalchemy import Numeric, func
+from werkzeug.exceptions import BadRequest
+
+
+def escape_like(value):
+    """Escape the LIKE wildcards in a value, so that it only matches itself."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(column, value):
+    """Case-insensitive substring match on a column, which its trigram index can serve."""
+    return column.ilike(f"%{escape_like(value)}%", escape="\\")
+
+
+def sort_keys(column, value, *keys):
+    """Get the sort keys for a list, with the closest matches to a search first if the client asked for relevance.
+
+    Similarity is rounded to a fixed precision so that it survives the round trip through a pagination cursor.
+    """
+    sort = request.args.get("sort", type=str)
+    if sort is None:
+        return keys
+    if sort != "relevance":
+        raise BadRequest("sort must be relevance.")
+    if not value:
+        raise BadRequest(f"sort=relevance requires a {column.key} to search for.")
+
+    return (-func.round(func.similarity(column, value).cast(Numeric), 6).label("relevance"), *keys)
@@ -1,79 +1,120 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import by_ids, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
 from app.grade import grade
+from app.includes import document, list_document, requested_includes
 from app.models import Grade
-from flask import Response, request, url_for
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
+from app.projections import GradeItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-grade_schema = openapi["components"]["schemas"]["GradeRequest"]
+from jsonschema import ValidationError
+from werkzeug.exceptions import BadRequest, HTTPException, InternalServerError
 
 
 @grade.route("/<uuid:organisation_id>/grades", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("grades")
 def list(organisation_id):
     """Get a list of Grades in an Organisation."""
+    fields = requested_fields("GradeItem")
+    includes = requested_includes(Grade)
     name_query = request.args.get("name", type=str)
 
+    query = Grade.query.filter_by(organisation_id=str(organisation_id))
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, GradeItem, ids, fields, includes)
+
     if name_query:
-        grades = (
-            Grade.query.filter(Grade.name.ilike(f"%{name_query}%"))
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Grade.name.asc())
-            .all()
+        query = query.filter(contains(Grade.name, name_query))
+
+    query, next_cursor = paginate(query, *sort_keys(Grade.name, name_query, Grade.name, Grade.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Grade.id.label("ID"),
+                Grade.name.label("NAME"),
+                isoformat(Grade.created_at).label("CREATED_AT"),
+                isoformat(Grade.updated_at).label("UPDATED_AT"),
+            ),
+            "grades.csv",
+            next_cursor,
         )
-    else:
-        grades = Grade.query.filter_by(organisation_id=str(organisation_id)).order_by(Grade.name.asc()).all()
 
-    if grades:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [grade.list_item() for grade in grades]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for grade in grades:
-                    w.writerow(
-                        (
-                            grade.id,
-                            grade.name,
-                            grade.created_at.isoformat(),
-                            grade.updated_at.isoformat() if grade.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="grades.csv")
-            return response
-    else:
+    grades = load(query, GradeItem, fields, includes)
+    if not grades:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(grades, Grade, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
+
+def csv_response(grades, next_cursor):
+    """Stream a page of Grades as CSV, or respond with no content if there are none."""
+    if not grades:
         return Response(mimetype="application/json", status=204)
 
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for grade in grades:
+            w.writerow(
+                (
+                    grade.id,
+                    grade.name,
+                    grade.created_at.isoformat(),
+                    grade.updated_at.isoformat() if grade.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="grades.csv")
+    return response
+
+
+@grade.route("/<uuid:organisation_id>/grades:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Grades in an Organisation by their IDs."""
+    query = Grade.query.filter_by(organisation_id=str(organisation_id))
+
+    return by_ids(query, GradeItem, requested_ids(), requested_fields("GradeItem"), requested_includes(Grade))
+
 
 @grade.route("/<uuid:organisation_id>/grades", methods=["POST"])
 @consumes("application/json")
@@ -83,7 +124,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, grade_schema, format_checker=FormatChecker())
+        validate(request.json, "GradeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -99,7 +140,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(grade), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "grades")
+
+    response = Response(dumps(grade.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "grade.get",
         organisation_id=organisation_id,
@@ -111,11 +154,17 @@ def create(organisation_id):
 
 @grade.route("/<uuid:organisation_id>/grades/<uuid:grade_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "grades", "roles")
 def get(organisation_id, grade_id):
     """Get a specific Grade in an Organisation."""
-    grade = Grade.query.get_or_404(str(grade_id))
+    fields = requested_fields("Grade")
+    includes = requested_includes(Grade)
+    response = conditional(Grade, str(grade_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        grade = Grade.query.options(*counts(fields)).get_or_404(str(grade_id))
+        response.set_data(dumps(document(grade, fields, includes)))
 
-    return Response(repr(grade), mimetype="application/json", status=200)
+    return response
 
 
 @grade.route("/<uuid:organisation_id>/grades/<uuid:grade_id>", methods=["PUT"])
@@ -126,36 +175,50 @@ def update(organisation_id, grade_id):
 
     # Validate request against schema
     try:
-        validate(request.json, grade_schema, format_checker=FormatChecker())
+        validate(request.json, "GradeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    grade = Grade.query.get_or_404(str(grade_id))
-
-    grade.name = request.json["name"]
-    grade.updated_at = datetime.utcnow()
-
-    db.session.add(grade)
     try:
+        grade = update_row(
+            Grade,
+            str(grade_id),
+            {
+                "name": request.json["name"],
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Grade, grade.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(grade), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "grades")
+
+    response = Response(dumps(grade.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @grade.route("/<uuid:organisation_id>/grades/<uuid:grade_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, grade_id):
     """Delete a Grade with a specific ID."""
-    grade = Grade.query.get_or_404(str(grade_id))
-
-    db.session.delete(grade)
     try:
+        delete_row(Grade, str(grade_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "grades", "roles", "people")
+
     return Response(mimetype="application/json", status=204)
@@ -0,0 +1,99 @@
+from app import db
+from app.models import Person, Practice, Programme, Project, Role
+from app.projections import GradeItem, LocationItem, PersonItem, PracticeItem, ProgrammeItem, RoleItem, projected
+from app.serializers import dumps
+from app.streaming import json_array
+from flask import request
+from werkzeug.exceptions import BadRequest
+
+# Relations that can be included with each model: the column of its own that refers to the related row, and the type
+# of list item the related row is included as
+RELATIONS = {
+    Practice: {"head": ("head_id", PersonItem)},
+    Role: {"grade": ("grade_id", GradeItem), "practice": ("practice_id", PracticeItem)},
+    Person: {"role": ("role_id", RoleItem), "location": ("location_id", LocationItem)},
+    Programme: {"manager": ("manager_id", PersonItem)},
+    Project: {"manager": ("manager_id", PersonItem), "programme": ("programme_id", ProgrammeItem)},
+}
+
+# Collection that included items of each type are listed under
+COLLECTIONS = {
+    GradeItem: "grades",
+    LocationItem: "locations",
+    PersonItem: "people",
+    PracticeItem: "practices",
+    ProgrammeItem: "programmes",
+    RoleItem: "roles",
+}
+
+
+def requested_includes(model):
+    """Get the relations a client asked to include in the include query parameter, or None if it didn't ask for any.
+
+    Paths such as programme.manager follow relations of related rows. They are returned as a tree of relation names.
+    """
+    include = request.args.get("include", type=str)
+    if include is None:
+        return None
+
+    includes = {}
+    for path in include.split(","):
+        node, current = includes, model
+        for name in path.split("."):
+            if name not in RELATIONS.get(current, {}):
+                raise BadRequest(f"{name} isn't a relation of {current.__name__} that can be included.")
+            node = node.setdefault(name, {})
+            current = RELATIONS[current][name][1].model
+
+    return includes
+
+
+def included(rows, model, includes):
+    """Get the list items of the rows related to rows of a model by a tree of relations, by collection, once each.
+
+    Each relation on a path is loaded with one IN query for every row it refers to that hasn't already been loaded.
+    """
+    loaded = {}
+
+    def load(rows, model, includes):
+        for name, nested in includes.items():
+            column, item = RELATIONS[model][name]
+            items = loaded.setdefault(item, {})
+            ids = {getattr(row, column) for row in rows} - {None}
+            missing = ids - items.keys()
+            if missing:
+                query = item.model.query.filter(item.model.id.in_(missing)).order_by(item.model.id)
+                items.update((row.id, row) for row in map(item._make, db.session.execute(projected(query, item))))
+            load([items[id] for id in ids if id in items], item.model, nested)
+
+    load(rows, model, includes)
+
+    return {COLLECTIONS[item]: [row.list_item() for row in items.values()] for item, items in loaded.items()}
+
+
+def document(row, fields, includes):
+    """Get the representation of a row, as a compound document with the rows it includes if any are requested."""
+    if includes is None:
+        return row.as_dict(fields)
+
+    return {"data": row.as_dict(fields), "included": included([row], type(row), includes)}
+
+
+def list_document(items, model, fields, includes):
+    """Encode a page of list items as a JSON array, or as a compound document with the rows they include if any are
+    requested. The items are streamed either way, and the rows they include are loaded once the last has been sent.
+    """
+    if includes is None:
+        yield from json_array(item.list_item(fields) for item in items)
+        return
+
+    rows = []
+
+    def data():
+        for item in items:
+            rows.append(item)
+            yield item.list_item(fields)
+
+    yield b'{"data":'
+    yield from json_array(data())
+    yield b',"included":' + dumps(included(rows, model, includes)) + b"}"
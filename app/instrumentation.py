@@ -0,0 +1,266 @@
+import random
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from app import db
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+
+# Figures from each node of a JSON query plan that are logged along with its type and the table and index it reads.
+# Conditions, keys and outputs are left out, as they can show the values of parameters.
+PLAN_FIGURES = (
+    "Rows Removed by Filter",
+    "Rows Removed by Index Recheck",
+    "Rows Removed by Join Filter",
+    "Heap Fetches",
+    "Sort Method",
+    "Sort Space Used",
+    "Shared Hit Blocks",
+    "Shared Read Blocks",
+    "Shared Dirtied Blocks",
+    "Shared Written Blocks",
+    "Temp Read Blocks",
+    "Temp Written Blocks",
+)
+
+
+def plan_lines(node, depth=0):
+    """Describe each node of a JSON query plan on a line, indented as EXPLAIN does, without anything that can show the
+    values of the statement's parameters.
+    """
+    line = node["Node Type"]
+    if "Join Type" in node:
+        line += f" ({node['Join Type']})"
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+    line += f"  (cost={node['Startup Cost']:.2f}..{node['Total Cost']:.2f} rows={node['Plan Rows']})"
+    if node.get("Actual Loops"):
+        line += (
+            f" (actual time={node['Actual Startup Time']:.3f}..{node['Actual Total Time']:.3f}"
+            f" rows={node['Actual Rows']} loops={node['Actual Loops']})"
+        )
+    elif "Actual Loops" in node:
+        line += " (never executed)"
+
+    figures = [f"{figure}: {node[figure]}" for figure in PLAN_FIGURES if node.get(figure)]
+    if figures:
+        line += f" [{', '.join(figures)}]"
+
+    yield ("      " * (depth - 1) + "  ->  " if depth else "") + line
+    for child in node.get("Plans", []):
+        yield from plan_lines(child, depth + 1)
+
+
+class QueryCounter(object):
+    """Number of SQL statements executed, and the time spent executing them in milliseconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.time += duration
+
+
+class QueryInstrumentation(object):
+    """Count the SQL statements each request executes and the time they take.
+
+    The totals are sent in a Server-Timing header and logged when the request ends, with a warning if they go over the
+    budget for the endpoint. Statements executed while a streamed response is sent are logged, but are too late to be
+    included in its headers.
+
+    Statements slower than SLOW_QUERY_THRESHOLD are logged too, if it's set, and a sample of those that only read are
+    run again with EXPLAIN ANALYZE once the response has been sent, to log how the database executed them.
+    """
+
+    def __init__(self, app=None):
+        self.counters = []
+        self.explain_engines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("QUERY_COUNT_BUDGET", 20)
+        app.config.setdefault("QUERY_TIME_BUDGET", 500)
+        app.config.setdefault("QUERY_BUDGETS", {})
+        app.config.setdefault("SLOW_QUERY_THRESHOLD", None)
+        app.config.setdefault("SLOW_QUERY_EXPLAIN_RATE", 0.1)
+        app.config.setdefault("SLOW_QUERY_EXPLAIN_DATABASE_URL", None)
+        app.config.setdefault("SLOW_QUERY_EXPLAIN_TIMEOUT", 5000)
+
+        if not event.contains(Engine, "before_cursor_execute", self.before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "query_start", None)
+        if start is None:
+            return
+        duration = (time.perf_counter() - start) * 1000
+
+        if has_request_context() and "queries" in g:
+            g.queries.add(duration)
+        for counter in self.counters:
+            counter.add(duration)
+
+        if has_app_context():
+            threshold = current_app.config["SLOW_QUERY_THRESHOLD"]
+            if threshold is not None and duration > threshold:
+                self.slow_query(statement, parameters, executemany, duration)
+
+    def slow_query(self, statement, parameters, executemany, duration):
+        """Log a slow statement, and keep it to be explained at the end of the request if it's sampled."""
+        endpoint = request.endpoint if has_request_context() else None
+        current_app.logger.warning(
+            "Slow query in %s took %.1fms: %s",
+            endpoint,
+            duration,
+            statement,
+            extra={"endpoint": endpoint, "duration": round(duration, 1), "statement": statement},
+        )
+
+        # EXPLAIN ANALYZE runs the statement again, so only do that for those that can't change anything
+        explainable = not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+        sampled = random.random() < current_app.config["SLOW_QUERY_EXPLAIN_RATE"]  # nosec - not for security
+        if explainable and sampled and "slow_queries" in g:
+            g.slow_queries.append((statement, parameters, duration))
+
+    def before_request(self):
+        g.queries = QueryCounter()
+        g.request_start = time.perf_counter()
+        g.slow_queries = []
+
+    def after_request(self, response):
+        queries = g.get("queries")
+        if queries is not None:
+            response.headers.add("Server-Timing", f'db;dur={queries.time:.1f};desc="{queries.count} queries"')
+            response.headers.add("Server-Timing", f"app;dur={(time.perf_counter() - g.request_start) * 1000:.1f}")
+        if current_app.config["SLOW_QUERY_THRESHOLD"] is not None and "slow_queries" in g:
+            # Statements run while a streamed response is sent are added to the list until it's closed
+            response.call_on_close(
+                partial(self.explain, current_app._get_current_object(), request.endpoint, g.slow_queries)
+            )
+        return response
+
+    def explain(self, app, endpoint, slow_queries):
+        """Log the plans of slow statements, run again with EXPLAIN ANALYZE in a read only transaction.
+
+        Runs after the response has been sent, on the replica given by SLOW_QUERY_EXPLAIN_DATABASE_URL if there is one.
+        The bound parameters are used but never logged, as they may be personal data. Nor is anything from the plan
+        that can show them, such as its conditions.
+        """
+        if not slow_queries:
+            return
+
+        with app.app_context():
+            url = app.config["SLOW_QUERY_EXPLAIN_DATABASE_URL"]
+            if url is None:
+                engine = db.engine
+            else:
+                if url not in self.explain_engines:
+                    self.explain_engines[url] = create_engine(url, pool_size=1, max_overflow=0)
+                engine = self.explain_engines[url]
+
+            for statement, parameters, duration in slow_queries:
+                connection = engine.raw_connection()
+                try:
+                    cursor = connection.cursor()
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                    cursor.execute(
+                        "SELECT set_config('statement_timeout', %s, true)",
+                        (str(app.config["SLOW_QUERY_EXPLAIN_TIMEOUT"]),),
+                    )
+                    cursor.execute(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+                    )  # nosec - statements the app ran
+                    explained = cursor.fetchone()[0][0]
+                except Exception:
+                    app.logger.exception("Couldn't explain slow query in %s", endpoint)
+                    continue
+                finally:
+                    connection.rollback()
+                    connection.close()
+
+                plan = "\n".join(
+                    [
+                        *plan_lines(explained["Plan"]),
+                        f"Planning Time: {explained['Planning Time']:.3f} ms",
+                        f"Execution Time: {explained['Execution Time']:.3f} ms",
+                    ]
+                )
+                app.logger.warning(
+                    "Plan of slow query in %s that took %.1fms: %s\n%s",
+                    endpoint,
+                    duration,
+                    statement,
+                    plan,
+                    extra={
+                        "endpoint": endpoint,
+                        "duration": round(duration, 1),
+                        "statement": statement,
+                        "parameters": sorted(parameters) if isinstance(parameters, dict) else len(parameters or ()),
+                        "plan": plan,
+                    },
+                )
+
+    def teardown_request(self, exception):
+        queries = g.get("queries")
+        if queries is None:
+            return
+
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "queries": queries.count,
+            "query_time": round(queries.time, 1),
+            "duration": round((time.perf_counter() - g.request_start) * 1000, 1),
+        }
+        current_app.logger.info(
+            "%(method)s %(path)s queries=%(queries)d query_time=%(query_time).1fms duration=%(duration).1fms",
+            fields,
+            extra=fields,
+        )
+
+        count, duration = current_app.config["QUERY_BUDGETS"].get(
+            request.endpoint, (current_app.config["QUERY_COUNT_BUDGET"], current_app.config["QUERY_TIME_BUDGET"])
+        )
+        if queries.count > count or queries.time > duration:
+            current_app.logger.warning(
+                "%(endpoint)s went over its query budget of %(count)d queries in %(budget)dms",
+                {**fields, "count": count, "budget": duration},
+                extra={**fields, "query_count_budget": count, "query_time_budget": duration},
+            )
+
+
+instrumentation = QueryInstrumentation()
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed in a block, for tests to check that an endpoint stays within a number.
+
+    with count_queries() as queries:
+        client.get(url)
+    assert queries.count <= 3
+    """
+    counter = QueryCounter()
+    instrumentation.counters.append(counter)
+    try:
+        yield counter
+    finally:
+        instrumentation.counters.remove(counter)
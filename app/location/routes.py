@@ -1,80 +1,123 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import batch_items, build, by_ids, created, insert_all, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.location import location
 from app.models import Location
-from flask import Response, request, url_for
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
+from app.projections import LocationItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-location_schema = openapi["components"]["schemas"]["LocationRequest"]
+from jsonschema import ValidationError
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, HTTPException, InternalServerError
 
 
 @location.route("/<uuid:organisation_id>/locations", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("locations")
 def list(organisation_id):
     """Get a list of Locations in an Organisation."""
+    fields = requested_fields("LocationItem")
+    includes = requested_includes(Location)
     name_query = request.args.get("name", type=str)
 
+    query = Location.query.filter_by(organisation_id=str(organisation_id))
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, LocationItem, ids, fields, includes)
+
     if name_query:
-        locations = (
-            Location.query.filter(Location.name.ilike(f"%{name_query}%"))
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Location.name.asc())
-            .all()
+        query = query.filter(contains(Location.name, name_query))
+
+    query, next_cursor = paginate(query, *sort_keys(Location.name, name_query, Location.name, Location.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Location.id.label("ID"),
+                Location.name.label("NAME"),
+                Location.address.label("ADDRESS"),
+                isoformat(Location.created_at).label("CREATED_AT"),
+                isoformat(Location.updated_at).label("UPDATED_AT"),
+            ),
+            "locations.csv",
+            next_cursor,
         )
-    else:
-        locations = Location.query.filter_by(organisation_id=str(organisation_id)).order_by(Location.name.asc()).all()
 
-    if locations:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [location.list_item() for location in locations]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "ADDRESS", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for location in locations:
-                    w.writerow(
-                        (
-                            location.id,
-                            location.name,
-                            location.address,
-                            location.created_at.isoformat(),
-                            location.updated_at.isoformat() if location.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="locations.csv")
-            return response
-    else:
+    locations = load(query, LocationItem, fields, includes)
+    if not locations:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(locations, Location, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
+
+def csv_response(locations, next_cursor):
+    """Stream a page of Locations as CSV, or respond with no content if there are none."""
+    if not locations:
         return Response(mimetype="application/json", status=204)
 
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "ADDRESS", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for location in locations:
+            w.writerow(
+                (
+                    location.id,
+                    location.name,
+                    location.address,
+                    location.created_at.isoformat(),
+                    location.updated_at.isoformat() if location.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="locations.csv")
+    return response
+
+
+@location.route("/<uuid:organisation_id>/locations:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Locations in an Organisation by their IDs."""
+    query = Location.query.filter_by(organisation_id=str(organisation_id))
+
+    return by_ids(query, LocationItem, requested_ids(), requested_fields("LocationItem"), requested_includes(Location))
+
 
 @location.route("/<uuid:organisation_id>/locations", methods=["POST"])
 @consumes("application/json")
@@ -84,7 +127,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, location_schema, format_checker=FormatChecker())
+        validate(request.json, "LocationRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -101,7 +144,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(location), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "locations")
+
+    response = Response(dumps(location.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "location.get",
         organisation_id=organisation_id,
@@ -111,13 +156,49 @@ def create(organisation_id):
     return response
 
 
+@location.route("/<uuid:organisation_id>/locations:batch", methods=["POST"])
+@consumes("application/json", "application/x-ndjson")
+@produces("application/json")
+def batch(organisation_id):
+    """Create a batch of Locations in an Organisation, all or none of them."""
+    items = batch_items("LocationRequest")
+    locations = build(
+        items,
+        lambda item: Location(
+            name=item["name"],
+            address=item["address"],
+            organisation_id=str(organisation_id),
+        ),
+    )
+
+    try:
+        ids = insert_all(Location, locations)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise Conflict("One or more items conflict with, or refer to missing, existing resources.")
+    except Exception:
+        db.session.rollback()
+        raise InternalServerError
+
+    cache.invalidate(organisation_id, "locations")
+
+    return created(ids)
+
+
 @location.route("/<uuid:organisation_id>/locations/<uuid:location_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "locations", "people")
 def get(organisation_id, location_id):
     """Get a specific Location in an Organisation."""
-    location = Location.query.get_or_404(str(location_id))
+    fields = requested_fields("Location")
+    includes = requested_includes(Location)
+    response = conditional(Location, str(location_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        location = Location.query.options(*counts(fields)).get_or_404(str(location_id))
+        response.set_data(dumps(document(location, fields, includes)))
 
-    return Response(repr(location), mimetype="application/json", status=200)
+    return response
 
 
 @location.route("/<uuid:organisation_id>/locations/<uuid:location_id>", methods=["PUT"])
@@ -128,37 +209,51 @@ def update(organisation_id, location_id):
 
     # Validate request against schema
     try:
-        validate(request.json, location_schema, format_checker=FormatChecker())
+        validate(request.json, "LocationRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    location = Location.query.get_or_404(str(location_id))
-
-    location.name = request.json["name"]
-    location.address = request.json["address"]
-    location.updated_at = datetime.utcnow()
-
-    db.session.add(location)
     try:
+        location = update_row(
+            Location,
+            str(location_id),
+            {
+                "name": request.json["name"],
+                "address": request.json["address"],
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Location, location.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(location), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "locations")
+
+    response = Response(dumps(location.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @location.route("/<uuid:organisation_id>/locations/<uuid:location_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, location_id):
     """Delete a Location with a specific ID."""
-    location = Location.query.get_or_404(str(location_id))
-
-    db.session.delete(location)
     try:
+        delete_row(Location, str(location_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "locations")
+
     return Response(mimetype="application/json", status=204)
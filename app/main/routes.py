@@ -1,29 +1,72 @@
-import json
+import gzip
+import hashlib
+import zlib
 
+import brotli
+from app import limiter
 from app.main import main
-from flask import Response
+from app.metrics import export
+from app.schemas import openapi as openapi_spec
+from app.serializers import dumps
+from flask import Response, current_app, request
 from werkzeug.exceptions import HTTPException, InternalServerError
 
+# Minified OpenAPI document and its precompressed variants, built once at startup
+openapi_body = dumps(openapi_spec)
+openapi_etag = hashlib.sha256(openapi_body).hexdigest()
+openapi_encodings = {
+    "br": brotli.compress(openapi_body, quality=11),
+    "gzip": gzip.compress(openapi_body, compresslevel=9),
+    "deflate": zlib.compress(openapi_body, 9),
+}
+
 
 @main.route("/openapi", methods=["GET"])
 def openapi():
-    with open("openapi.json") as openapi_json:
-        openapi = json.load(openapi_json)
+    encoding = request.accept_encodings.best_match(openapi_encodings.keys())
+    etag = f"{openapi_etag}:{encoding}" if encoding else openapi_etag
+    headers = {
+        "Cache-Control": f"public, max-age={current_app.config['OPENAPI_CACHE_MAX_AGE']}",
+        "Vary": "Accept-Encoding",
+    }
 
-    return Response(
-        json.dumps(openapi, separators=(",", ":")),
+    # Any variant the client already holds is current, whichever encoding it was sent with
+    variants = [openapi_etag] + [f"{openapi_etag}:{variant}" for variant in openapi_encodings]
+    if any(request.if_none_match.contains_weak(variant) for variant in variants):
+        response = Response(mimetype="application/json", status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    response = Response(
+        openapi_encodings.get(encoding, openapi_body),
         mimetype="application/json",
         status=200,
+        headers=headers,
     )
+    response.set_etag(etag)
+
+    return response
+
+
+@main.route("/metrics", methods=["GET"])
+@limiter.exempt
+def metrics():
+    """Get metrics for Prometheus to scrape, for every worker in the server."""
+    data, content_type = export()
+
+    return Response(data, content_type=content_type, status=200)
 
 
 @main.app_errorhandler(HTTPException)
 def http_error(error):
+    body = {"code": error.code, "name": error.name, "description": error.description}
+    if getattr(error, "errors", None):
+        body["errors"] = error.errors
+
     return Response(
-        response=json.dumps(
-            {"code": error.code, "name": error.name, "description": error.description},
-            separators=(",", ":"),
-        ),
+        response=dumps(body),
         mimetype="application/json",
         status=error.code,
     )
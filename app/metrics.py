@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+REQUEST_DURATION = Histogram(
+    "flux_request_duration_seconds",
+    "Time taken to handle a request, including sending a streamed response",
+    ["method", "endpoint", "status"],
+)
+RESPONSE_SIZE = Histogram(
+    "flux_response_size_bytes",
+    "Size of response bodies as sent",
+    ["method", "endpoint"],
+    buckets=(100, 1000, 10000, 100000, 1000000, 10000000, 100000000, float("inf")),
+)
+RATE_LIMITED = Counter("flux_rate_limited_requests_total", "Requests rejected by the rate limiter", ["endpoint"])
+CACHE_REQUESTS = Counter("flux_response_cache_requests_total", "Cacheable requests, by cache result", ["result"])
+
+# Gauges are summed over the live workers, so that they describe the whole server
+POOL_SIZE = Gauge("flux_db_pool_size", "Database connections kept in the pool", multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("flux_db_pool_checked_out", "Database connections in use", multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge(
+    "flux_db_pool_overflow", "Database connections open beyond the size of the pool", multiprocess_mode="livesum"
+)
+
+
+def registry():
+    """Get the registry to export, collected from every worker's files if running under gunicorn."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+
+    return collector_registry
+
+
+def export():
+    """Render the metrics in the Prometheus text format."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+class MeasuredBody(object):
+    """Body of a streamed response that reports its size when it is closed, however much of it was sent."""
+
+    def __init__(self, chunks, observe):
+        self.chunks = chunks
+        self.iterator = iter(chunks)
+        self.observe = observe
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.iterator)
+        # Werkzeug sends text as UTF-8
+        self.size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+        return chunk
+
+    def close(self):
+        if hasattr(self.chunks, "close"):
+            self.chunks.close()
+        self.observe(self.size)
+
+
+class Metrics(object):
+    """Record request, response cache, rate limiter and database pool metrics for Prometheus.
+
+    Must be initialised before the rate limiter, so that requests it rejects are timed too.
+    """
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+        with app.app_context():
+            pool = db.engine.pool
+        POOL_SIZE.set(pool.size())
+
+        # The pool's own counts aren't updated until after a checkin event, so keep track here. Connections beyond the
+        # size of the pool are only kept open while they're checked out.
+        checked_out = [0]
+        lock = threading.Lock()
+
+        def update_pool(change):
+            with lock:
+                checked_out[0] += change
+                POOL_CHECKED_OUT.set(checked_out[0])
+                POOL_OVERFLOW.set(max(checked_out[0] - pool.size(), 0))
+
+        event.listen(pool, "checkout", lambda *args: update_pool(1))
+        event.listen(pool, "checkin", lambda *args: update_pool(-1))
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def after_request(self, response):
+        endpoint = request.endpoint or "none"
+        start = g.get("metrics_start", time.perf_counter())
+        labels = {"method": request.method, "endpoint": endpoint}
+
+        if response.status_code == 429:
+            RATE_LIMITED.labels(endpoint).inc()
+        if "X-Cache" in response.headers:
+            CACHE_REQUESTS.labels(response.headers["X-Cache"].lower()).inc()
+
+        def observe(size):
+            REQUEST_DURATION.labels(status=response.status_code, **labels).observe(time.perf_counter() - start)
+            RESPONSE_SIZE.labels(**labels).observe(size)
+
+        if not response.is_streamed:
+            observe(response.calculate_content_length() or 0)
+            return response
+
+        # A streamed response is only complete once it has been sent, so measure it as it goes
+        response.response = MeasuredBody(response.response, observe)
+
+        return response
+
+
+metrics = Metrics()
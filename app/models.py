@@ -1,10 +1,11 @@
-import json
 import uuid
 from datetime import datetime
 
 from sqlalchemy.dialects.postgresql import UUID
 
 from app import db
+from app.fields import sparse
+from app.serializers import dumps
 
 # person_team = db.Table(
 #     "person_team",
@@ -47,6 +48,12 @@ class Organisation(db.Model):
     domain = db.Column(db.String(), nullable=False, index=True, unique=True)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_organisation_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
 
     # Relationships
     grades = db.relationship("Grade", backref="organisation")
@@ -65,23 +72,26 @@ class Organisation(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "domain": self.domain,
-            "grades": len(self.grades),
-            "locations": len(self.locations),
-            "people": len(self.people),
-            "practices": len(self.practices),
-            "programmes": len(self.programmes),
-            "projects": len(self.projects),
-            "roles": len(self.roles),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "domain": self.domain,
+                "grades": lambda: self.grade_count,
+                "locations": lambda: self.location_count,
+                "people": lambda: self.person_count,
+                "practices": lambda: self.practice_count,
+                "programmes": lambda: self.programme_count,
+                "projects": lambda: self.project_count,
+                "roles": lambda: self.role_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            },
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -99,6 +109,19 @@ class Location(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_location_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_location_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_location_organisation_id_name_id", "organisation_id", "name", "id"),
+    )
 
     # Relationships
     people = db.relationship("Person", backref="location", lazy=True)
@@ -112,21 +135,24 @@ class Location(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "address": self.address,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "address": self.address,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "people": lambda: self.person_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "people": len(self.people),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {"id": self.id, "name": self.name}
@@ -139,6 +165,19 @@ class Grade(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_grade_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_grade_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_grade_organisation_id_name_id", "organisation_id", "name", "id"),
+    )
 
     # Relationships
     roles = db.relationship("Role", backref="grade", lazy=True)
@@ -151,20 +190,23 @@ class Grade(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "roles": lambda: self.role_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "roles": len(self.roles),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {"id": self.id, "name": self.name}
@@ -179,6 +221,19 @@ class Practice(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_practice_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_practice_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_practice_organisation_id_name_id", "organisation_id", "name", "id"),
+    )
 
     # Relationships
     head = db.relationship("Person", uselist=False)
@@ -194,27 +249,30 @@ class Practice(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "head": {
-                "id": self.head.id,
-                "name": self.head.name,
-            }
-            if self.head
-            else None,
-            "cost_centre": self.cost_centre,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "head": lambda: {
+                    "id": self.head.id,
+                    "name": self.head.name,
+                }
+                if self.head
+                else None,
+                "cost_centre": self.cost_centre,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "roles": lambda: self.role_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "roles": len(self.roles),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -238,6 +296,19 @@ class Role(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_role_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        db.Index(
+            "ix_role_organisation_id_lower_title",
+            "organisation_id",
+            db.func.lower(title).label("lower_title"),
+            postgresql_ops={"lower_title": "text_pattern_ops"},
+        ),
+        db.Index("ix_role_organisation_id_title_id", "organisation_id", "title", "id"),
+    )
 
     # Relationships
     people = db.relationship("Person", backref="role", lazy=True)
@@ -252,22 +323,25 @@ class Role(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "grade": {"id": self.grade.id, "name": self.grade.name},
-            "practice": self.practice.list_item() if self.practice else None,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "title": self.title,
+                "grade": lambda: {"id": self.grade.id, "name": self.grade.name},
+                "practice": lambda: self.practice.list_item() if self.practice else None,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "people": lambda: self.person_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "people": len(self.people),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -300,6 +374,19 @@ class Person(db.Model):
     employment = db.Column(db.String, nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_person_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_person_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_person_organisation_id_name_id", "organisation_id", "name", "id"),
+    )
 
     # Relationships
     # teams = db.relationship(
@@ -337,24 +424,27 @@ class Person(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "role": lambda: self.role.list_item(),
+                "email_address": self.email_address,
+                "full_time_equivalent": self.full_time_equivalent,
+                "location": lambda: self.location.list_item(),
+                "employment": self.employment,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "role": self.role.list_item(),
-            "email_address": self.email_address,
-            "full_time_equivalent": self.full_time_equivalent,
-            "location": self.location.list_item(),
-            "employment": self.employment,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -373,6 +463,19 @@ class Programme(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_programme_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_programme_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_programme_organisation_id_name_id", "organisation_id", "name", "id"),
+    )
 
     # Relationships
     manager = db.relationship("Person", uselist=False)
@@ -387,26 +490,29 @@ class Programme(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "manager": {
-                "id": self.manager.id,
-                "name": self.manager.name,
-            }
-            if self.manager
-            else None,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "manager": lambda: {
+                    "id": self.manager.id,
+                    "name": self.manager.name,
+                }
+                if self.manager
+                else None,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "projects": lambda: self.project_count,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "projects": len(self.projects),
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -431,6 +537,20 @@ class Project(db.Model):
     organisation_id = db.Column(UUID, db.ForeignKey("organisation.id"), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Indexes
+    __table_args__ = (
+        db.Index("ix_project_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        db.Index(
+            "ix_project_organisation_id_lower_name",
+            "organisation_id",
+            db.func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+        db.Index("ix_project_organisation_id_name_id", "organisation_id", "name", "id"),
+        db.Index("ix_project_organisation_id_status_name_id", "organisation_id", "status", "name", "id"),
+    )
 
     # Relationships
     manager = db.relationship("Person", uselist=False)
@@ -448,32 +568,35 @@ class Project(db.Model):
         self.created_at = datetime.utcnow()
 
     def __repr__(self):
-        return json.dumps(self.as_dict(), separators=(",", ":"))
-
-    def as_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "manager": {
-                "id": self.manager.id,
-                "name": self.manager.name,
-            }
-            if self.manager
-            else None,
-            "programme": {
-                "id": self.programme.id,
-                "name": self.programme.name,
-            }
-            if self.programme
-            else None,
-            "status": self.status,
-            "organisation": {
-                "id": self.organisation.id,
-                "name": self.organisation.name,
+        return dumps(self.as_dict()).decode()
+
+    def as_dict(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "manager": lambda: {
+                    "id": self.manager.id,
+                    "name": self.manager.name,
+                }
+                if self.manager
+                else None,
+                "programme": lambda: {
+                    "id": self.programme.id,
+                    "name": self.programme.name,
+                }
+                if self.programme
+                else None,
+                "status": self.status,
+                "organisation": lambda: {
+                    "id": self.organisation.id,
+                    "name": self.organisation.name,
+                },
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
             },
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+            fields,
+        )
 
     def list_item(self):
         return {
@@ -495,6 +618,31 @@ class Project(db.Model):
         }
 
 
+def _count(model, foreign_key, primary_key):
+    """Correlated COUNT(*) subquery for a deferred aggregate column."""
+    return db.column_property(
+        db.select(db.func.count(model.id)).where(foreign_key == primary_key).correlate_except(model).scalar_subquery(),
+        deferred=True,
+        group="counts",
+    )
+
+
+# Child counts used by as_dict(). These are deferred so that list queries don't pay for them, and grouped so that
+# accessing any one of them loads them all in a single SELECT.
+Organisation.grade_count = _count(Grade, Grade.organisation_id, Organisation.id)
+Organisation.location_count = _count(Location, Location.organisation_id, Organisation.id)
+Organisation.person_count = _count(Person, Person.organisation_id, Organisation.id)
+Organisation.practice_count = _count(Practice, Practice.organisation_id, Organisation.id)
+Organisation.programme_count = _count(Programme, Programme.organisation_id, Organisation.id)
+Organisation.project_count = _count(Project, Project.organisation_id, Organisation.id)
+Organisation.role_count = _count(Role, Role.organisation_id, Organisation.id)
+Location.person_count = _count(Person, Person.location_id, Location.id)
+Grade.role_count = _count(Role, Role.grade_id, Grade.id)
+Practice.role_count = _count(Role, Role.practice_id, Practice.id)
+Role.person_count = _count(Person, Person.role_id, Role.id)
+Programme.project_count = _count(Project, Project.programme_id, Programme.id)
+
+
 # class Team(db.Model):
 #     # Fields
 #     id = db.Column(UUID, primary_key=True)
@@ -1,5 +1,5 @@
 from flask import Blueprint
 
-organisation = Blueprint("organisation", __name__, url_prefix="/v1/organisations")
+organisation = Blueprint("organisation", __name__, url_prefix="/v1")
 
 from app.organisation import routes  # noqa: E402, F401
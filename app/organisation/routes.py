@@ -1,82 +1,127 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import by_ids, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.models import Organisation
 from app.organisation import organisation
-from flask import Response, request, url_for
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
+from app.projections import OrganisationItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
+from jsonschema import ValidationError
 from sqlalchemy.exc import IntegrityError
-from werkzeug.exceptions import BadRequest, Conflict, InternalServerError
+from werkzeug.exceptions import BadRequest, Conflict, HTTPException, InternalServerError
 
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-organisation_schema = openapi["components"]["schemas"]["OrganisationRequest"]
 
-
-@organisation.route("", methods=["GET"])
+@organisation.route("/organisations", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("organisations")
 def list():
     """Get a list of Organisations."""
+    fields = requested_fields("OrganisationItem")
+    includes = requested_includes(Organisation)
     name_query = request.args.get("name", type=str)
 
+    query = Organisation.query
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, OrganisationItem, ids, fields, includes)
+
     if name_query:
-        organisations = (
-            Organisation.query.filter(Organisation.name.ilike(f"%{name_query}%"))
-            .order_by(Organisation.name.asc())
-            .all()
+        query = query.filter(contains(Organisation.name, name_query))
+
+    query, next_cursor = paginate(query, *sort_keys(Organisation.name, name_query, Organisation.name, Organisation.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Organisation.id.label("ID"),
+                Organisation.name.label("NAME"),
+                Organisation.domain.label("DOMAIN"),
+                isoformat(Organisation.created_at).label("CREATED_AT"),
+                isoformat(Organisation.updated_at).label("UPDATED_AT"),
+            ),
+            "organisations.csv",
+            next_cursor,
         )
-    else:
-        organisations = Organisation.query.order_by(Organisation.name.asc()).all()
 
-    if organisations:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [organisation.list_item() for organisation in organisations]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "DOMAIN", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for organisation in organisations:
-                    w.writerow(
-                        (
-                            organisation.id,
-                            organisation.name,
-                            organisation.domain,
-                            organisation.created_at.isoformat(),
-                            organisation.updated_at.isoformat() if organisation.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="organisations.csv")
-            return response
-    else:
+    organisations = load(query, OrganisationItem, fields, includes)
+    if not organisations:
         return Response(mimetype="application/json", status=204)
 
+    return Response(
+        stream_with_context(list_document(organisations, Organisation, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
 
-@organisation.route("", methods=["POST"])
+
+def csv_response(organisations, next_cursor):
+    """Stream a page of Organisations as CSV, or respond with no content if there are none."""
+    if not organisations:
+        return Response(mimetype="application/json", status=204)
+
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "DOMAIN", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for organisation in organisations:
+            w.writerow(
+                (
+                    organisation.id,
+                    organisation.name,
+                    organisation.domain,
+                    organisation.created_at.isoformat(),
+                    organisation.updated_at.isoformat() if organisation.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="organisations.csv")
+    return response
+
+
+@organisation.route("/organisations:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get():
+    """Get a batch of Organisations by their IDs."""
+    query = Organisation.query
+
+    return by_ids(
+        query, OrganisationItem, requested_ids(), requested_fields("OrganisationItem"), requested_includes(Organisation)
+    )
+
+
+@organisation.route("/organisations", methods=["POST"])
 @consumes("application/json")
 @produces("application/json")
 def create():
@@ -84,7 +129,7 @@ def create():
 
     # Validate request against schema
     try:
-        validate(request.json, organisation_schema, format_checker=FormatChecker())
+        validate(request.json, "OrganisationRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -100,22 +145,30 @@ def create():
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(organisation), mimetype="application/json", status=201)
+    cache.invalidate(None, "organisations")
+
+    response = Response(dumps(organisation.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for("organisation.get", organisation_id=organisation.id)
 
     return response
 
 
-@organisation.route("/<uuid:organisation_id>", methods=["GET"])
+@organisation.route("/organisations/<uuid:organisation_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "grades", "locations", "people", "practices", "programmes", "projects", "roles")
 def get(organisation_id):
     """Get a specific Organisation."""
-    organisation = Organisation.query.get_or_404(str(organisation_id))
+    fields = requested_fields("Organisation")
+    includes = requested_includes(Organisation)
+    response = conditional(Organisation, str(organisation_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        organisation = Organisation.query.options(*counts(fields)).get_or_404(str(organisation_id))
+        response.set_data(dumps(document(organisation, fields, includes)))
 
-    return Response(repr(organisation), mimetype="application/json", status=200)
+    return response
 
 
-@organisation.route("/<uuid:organisation_id>", methods=["PUT"])
+@organisation.route("/organisations/<uuid:organisation_id>", methods=["PUT"])
 @consumes("application/json")
 @produces("application/json")
 def update(organisation_id):
@@ -123,19 +176,25 @@ def update(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, organisation_schema, format_checker=FormatChecker())
+        validate(request.json, "OrganisationRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    organisation = Organisation.query.get_or_404(str(organisation_id))
-
-    organisation.name = request.json["name"]
-    organisation.domain = request.json["domain"]
-    organisation.updated_at = datetime.utcnow()
-
-    db.session.add(organisation)
     try:
+        organisation = update_row(
+            Organisation,
+            str(organisation_id),
+            {
+                "name": request.json["name"],
+                "domain": request.json["domain"],
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Organisation, organisation.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except IntegrityError:
         db.session.rollback()
         raise Conflict()
@@ -143,20 +202,32 @@ def update(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(organisation), mimetype="application/json", status=200)
+    cache.invalidate(None, "organisations")
+    cache.invalidate(organisation_id, "organisation")
+
+    response = Response(dumps(organisation.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
-@organisation.route("/<uuid:organisation_id>", methods=["DELETE"])
+@organisation.route("/organisations/<uuid:organisation_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id):
     """Delete a specific Organisation."""
-    organisation = Organisation.query.get_or_404(str(organisation_id))
-
-    db.session.delete(organisation)
     try:
+        delete_row(Organisation, str(organisation_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(None, "organisations")
+    cache.invalidate(
+        organisation_id, "organisation", "grades", "locations", "people", "practices", "programmes", "projects", "roles"
+    )
+
     return Response(mimetype="application/json", status=204)
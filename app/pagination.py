@@ -0,0 +1,106 @@
+import base64
+import binascii
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app, request, url_for
+from sqlalchemy import Numeric, tuple_
+from sqlalchemy.dialects.postgresql import UUID
+from werkzeug.exceptions import BadRequest
+
+
+def encode_cursor(values):
+    """Encode the sort key values of the last row on a page as an opaque cursor."""
+    data = json.dumps(list(values), separators=(",", ":"), default=str).encode()
+
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_value(value, key):
+    """Check a cursor value against the type of its sort key, converting it to the value the database compares.
+
+    Every value is encoded as a string: UUIDs and numbers, such as relevance, by their string form.
+    """
+    if not isinstance(value, str) or "\x00" in value:
+        raise BadRequest("Invalid cursor.")
+
+    try:
+        if isinstance(key.type, UUID):
+            return str(uuid.UUID(value))
+        if isinstance(key.type, Numeric):
+            number = Decimal(value)
+            if not number.is_finite():
+                raise BadRequest("Invalid cursor.")
+            return number
+    except (InvalidOperation, ValueError):
+        raise BadRequest("Invalid cursor.")
+
+    return value
+
+
+def decode_cursor(cursor, keys):
+    """Decode a cursor back into the values of the sort keys it was created from."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest("Invalid cursor.")
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise BadRequest("Invalid cursor.")
+
+    return [decode_value(value, key) for value, key in zip(values, keys)]
+
+
+def page_limit():
+    """Get the page size for the request, within the configured bounds.
+
+    CSV exports are unbounded unless the client asks for a limit.
+    """
+    maximum = current_app.config["PAGINATION_MAX_LIMIT"]
+    limit = request.args.get("limit", type=str)
+
+    if limit is None:
+        accept = request.headers.getlist("accept")
+        if "text/csv" in accept and "application/json" not in accept:
+            return None
+        return current_app.config["PAGINATION_DEFAULT_LIMIT"]
+
+    if not limit.isdigit() or not 1 <= int(limit) <= maximum:
+        raise BadRequest(f"limit must be an integer between 1 and {maximum}.")
+
+    return int(limit)
+
+
+def paginate(query, *keys):
+    """Apply keyset pagination to a query, ordered by sort keys which together are unique.
+
+    Returns the query for the requested page and the cursor for the next page, or None if there isn't one.
+    """
+    cursor = request.args.get("cursor", type=str)
+    limit = page_limit()
+
+    if cursor:
+        query = query.filter(tuple_(*keys) > tuple_(*decode_cursor(cursor, keys)))
+    query = query.order_by(*[key.asc() for key in keys])
+
+    if limit is None:
+        return query, None
+
+    # Look at the last row of this page and the first of the next, without loading the page itself
+    boundary = query.with_entities(*keys).offset(limit - 1).limit(2).all()
+    next_cursor = encode_cursor(boundary[0]) if len(boundary) == 2 else None
+
+    return query.limit(limit), next_cursor
+
+
+def link_headers(next_cursor):
+    """Build the Link header pointing at the next page of results, if there is one."""
+    if not next_cursor:
+        return {}
+
+    # The view's own arguments take the place of any query parameters with the same names
+    args = {**request.args.to_dict(), "cursor": next_cursor, **request.view_args}
+    url = url_for(request.endpoint, _external=True, **args)
+
+    return {"Link": f'<{url}>; rel="next"'}
@@ -1,118 +1,161 @@
 import csv
-import json
 from datetime import datetime
-from io import StringIO
+from io import StringIO, TextIOWrapper
 
 from app import db
+from app.batch import InvalidItems, batch_items, build, by_ids, check_unique, created, insert_all, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.models import Person
+from app.pagination import link_headers, paginate
 from app.person import person
-from flask import Response, request, url_for
+from app.pgcopy import copy_export, copy_from, copy_response, floatformat, isoformat, staging_table
+from app.projections import PersonItem, load
+from app.schemas import validate, validators
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, HTTPException, InternalServerError
 
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-person_schema = openapi["components"]["schemas"]["PersonRequest"]
+# Columns read from an imported CSV file, as well as any others in an exported one
+IMPORT_COLUMNS = ("name", "email_address", "full_time_equivalent", "employment", "role_id", "location_id")
 
 
 @person.route("/<uuid:organisation_id>/people", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("people", "roles", "grades", "practices", "locations")
 def list(organisation_id):
     """Get a list of People in an Organisation."""
+    fields = requested_fields("PersonItem")
+    includes = requested_includes(Person)
     name_query = request.args.get("name", type=str)
     role_filter = request.args.get("role_id", type=str)
     location_filter = request.args.get("location_id", type=str)
 
+    query = Person.query.filter_by(organisation_id=str(organisation_id))
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, PersonItem, ids, fields, includes)
+
     if name_query:
-        people = (
-            Person.query.filter(Person.name.ilike(f"%{name_query}%"))
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Person.name.asc())
-            .all()
-        )
+        query = query.filter(contains(Person.name, name_query))
     elif role_filter:
-        people = (
-            Person.query.filter_by(role_id=role_filter)
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Person.name.asc())
-            .all()
-        )
+        query = query.filter_by(role_id=role_filter)
     elif location_filter:
-        people = (
-            Person.query.filter_by(location_id=location_filter)
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Person.name.asc())
-            .all()
+        query = query.filter_by(location_id=location_filter)
+
+    query, next_cursor = paginate(query, *sort_keys(Person.name, name_query, Person.name, Person.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Person.id.label("ID"),
+                Person.name.label("NAME"),
+                Person.email_address.label("EMAIL_ADDRESS"),
+                floatformat(Person.full_time_equivalent).label("FULL_TIME_EQUIVALENT"),
+                Person.employment.label("EMPLOYMENT"),
+                isoformat(Person.created_at).label("CREATED_AT"),
+                isoformat(Person.updated_at).label("UPDATED_AT"),
+            ),
+            "people.csv",
+            next_cursor,
         )
-    else:
-        people = Person.query.filter_by(organisation_id=str(organisation_id)).order_by(Person.name.asc()).all()
 
-    if people:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [person.list_item() for person in people]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
+
+    people = load(query, PersonItem, fields, includes)
+    if not people:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(people, Person, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
+def csv_response(people, next_cursor):
+    """Stream a page of People as CSV, or respond with no content if there are none."""
+    if not people:
+        return Response(mimetype="application/json", status=204)
+
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(
+            (
+                "ID",
+                "NAME",
+                "EMAIL_ADDRESS",
+                "FULL_TIME_EQUIVALENT",
+                "EMPLOYMENT",
+                "CREATED_AT",
+                "UPDATED_AT",
             )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(
-                    (
-                        "ID",
-                        "NAME",
-                        "EMAIL_ADDRESS",
-                        "FULL_TIME_EQUIVALENT",
-                        "EMPLOYMENT",
-                        "CREATED_AT",
-                        "UPDATED_AT",
-                    )
+        )
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for person in people:
+            w.writerow(
+                (
+                    person.id,
+                    person.name,
+                    person.email_address,
+                    person.full_time_equivalent,
+                    person.employment,
+                    person.created_at.isoformat(),
+                    person.updated_at.isoformat() if person.updated_at else None,
                 )
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for person in people:
-                    w.writerow(
-                        (
-                            person.id,
-                            person.name,
-                            person.email_address,
-                            person.full_time_equivalent,
-                            person.employment,
-                            person.created_at.isoformat(),
-                            person.updated_at.isoformat() if person.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="people.csv")
-            return response
-    else:
-        return Response(mimetype="application/json", status=204)
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
 
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="people.csv")
+    return response
 
-@person.route("/<uuid:organisation_id>/people", methods=["POST"])
+
+@person.route("/<uuid:organisation_id>/people:batchGet", methods=["POST"])
 @consumes("application/json")
 @produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of People in an Organisation by their IDs."""
+    query = Person.query.filter_by(organisation_id=str(organisation_id))
+
+    return by_ids(query, PersonItem, requested_ids(), requested_fields("PersonItem"), requested_includes(Person))
+
+
+@person.route("/<uuid:organisation_id>/people", methods=["POST"])
+@consumes("application/json", "text/csv")
+@produces("application/json")
 def create(organisation_id):
-    """Create a new Person in an Organisation."""
+    """Create a new Person in an Organisation, or import People from a CSV file."""
+    if request.mimetype == "text/csv":
+        return import_csv(organisation_id)
 
     # Validate request against schema
     try:
-        validate(request.json, person_schema, format_checker=FormatChecker())
+        validate(request.json, "PersonRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -134,7 +177,9 @@ def create(organisation_id):
     #     db.session.rollback()
     #     raise InternalServerError
 
-    response = Response(repr(person), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "people")
+
+    response = Response(dumps(person.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "person.get",
         organisation_id=organisation_id,
@@ -144,13 +189,176 @@ def create(organisation_id):
     return response
 
 
+def import_reader():
+    """Read the uploaded CSV file as a dictionary per row, keyed by lower case column names.
+
+    Raises an error if the file can't be read or is missing any of the columns to import.
+    """
+    reader = csv.DictReader(TextIOWrapper(request.stream, encoding="utf-8-sig", newline=""))
+    try:
+        headers = [header.strip().lower() for header in reader.fieldnames or []]
+    except (csv.Error, UnicodeDecodeError):
+        raise BadRequest("Invalid CSV file.")
+
+    missing = [column.upper() for column in IMPORT_COLUMNS if column not in headers]
+    if missing:
+        raise BadRequest(f"CSV file is missing columns: {', '.join(missing)}.")
+    reader.fieldnames = headers
+
+    return reader
+
+
+def import_person(record, organisation_id):
+    """Build a Person from a row of an imported CSV file, validated as a request to create one would be."""
+    item = {column: record[column] for column in IMPORT_COLUMNS if record[column]}
+    if "full_time_equivalent" in item:
+        item["full_time_equivalent"] = float(item["full_time_equivalent"])
+
+    error = best_match(validators["PersonRequest"].iter_errors(item))
+    if error is not None:
+        raise ValueError(error.message)
+
+    return Person(organisation_id=str(organisation_id), **item)
+
+
+def import_rows(reader, organisation_id, columns, errors):
+    """Generate the values of the columns for each row of an imported CSV file, adding an error for each invalid row.
+
+    Rows keep being validated after an error, to report them all, but stop being generated, as they would only be
+    rolled back.
+    """
+    email_addresses = set()
+    for index, record in enumerate(reader):
+        try:
+            person = import_person(record, organisation_id)
+            if person.email_address in email_addresses:
+                raise ValueError("email_address must be unique.")
+        except ValueError as e:
+            errors.append({"index": index, "description": str(e)})
+            continue
+
+        email_addresses.add(person.email_address)
+        if not errors:
+            yield [getattr(person, column) for column in columns]
+
+
+def merge_people(staging, columns):
+    """Merge staged people into the person table, updating those with the same email address in the same Organisation.
+
+    Returns whether each row merged was inserted, rather than updated.
+    """
+    statement = insert(Person).from_select(columns, db.select(*[staging.c[column] for column in columns]))
+    statement = statement.on_conflict_do_update(
+        index_elements=[Person.email_address],
+        set_={
+            "name": statement.excluded.name,
+            "role_id": statement.excluded.role_id,
+            "full_time_equivalent": statement.excluded.full_time_equivalent,
+            "location_id": statement.excluded.location_id,
+            "employment": statement.excluded.employment,
+            "updated_at": statement.excluded.created_at,
+            "version": Person.version + 1,
+        },
+        where=Person.organisation_id == statement.excluded.organisation_id,
+    ).returning(literal_column("xmax = 0"))
+
+    return db.session.execute(statement).scalars().all()
+
+
+def import_csv(organisation_id):
+    """Create or update People in an Organisation from a CSV file, matched on email address.
+
+    The upload is validated row by row as it streams into a staging table with COPY, then merged into the person table
+    with a single INSERT ... ON CONFLICT statement. Rows matching a Person in another Organisation are skipped.
+    """
+    reader = import_reader()
+    columns = [column.name for column in Person.__table__.columns if column.server_default is None]
+    errors = []
+
+    try:
+        staging = staging_table(Person)
+        copied = copy_from(staging, columns, import_rows(reader, organisation_id, columns, errors))
+        if errors:
+            raise InvalidItems(errors)
+
+        inserted = merge_people(staging, columns)
+        db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
+    except (csv.Error, UnicodeDecodeError):
+        db.session.rollback()
+        raise BadRequest("Invalid CSV file.")
+    except IntegrityError:
+        db.session.rollback()
+        raise Conflict("One or more rows refer to a Role or Location that doesn't exist.")
+    except Exception:
+        db.session.rollback()
+        raise InternalServerError
+
+    cache.invalidate(organisation_id, "people")
+
+    return Response(
+        dumps(
+            {
+                "inserted": inserted.count(True),
+                "updated": inserted.count(False),
+                "skipped": copied - len(inserted),
+            }
+        ),
+        mimetype="application/json",
+        status=200,
+    )
+
+
+@person.route("/<uuid:organisation_id>/people:batch", methods=["POST"])
+@consumes("application/json", "application/x-ndjson")
+@produces("application/json")
+def batch(organisation_id):
+    """Create a batch of People in an Organisation, all or none of them."""
+    items = batch_items("PersonRequest")
+    people = build(
+        items,
+        lambda item: Person(
+            name=item["name"],
+            email_address=item["email_address"],
+            full_time_equivalent=item["full_time_equivalent"],
+            location_id=item["location_id"],
+            employment=item["employment"],
+            role_id=item["role_id"],
+            organisation_id=str(organisation_id),
+        ),
+    )
+    check_unique(Person, people)
+
+    try:
+        ids = insert_all(Person, people)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise Conflict("One or more items conflict with, or refer to missing, existing resources.")
+    except Exception:
+        db.session.rollback()
+        raise InternalServerError
+
+    cache.invalidate(organisation_id, "people")
+
+    return created(ids)
+
+
 @person.route("/<uuid:organisation_id>/people/<uuid:person_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "people", "roles", "grades", "practices", "locations")
 def get(organisation_id, person_id):
     """Get a specific Person in an Organisation."""
-    person = Person.query.get_or_404(str(person_id))
+    fields = requested_fields("Person")
+    includes = requested_includes(Person)
+    response = conditional(Person, str(person_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        person = Person.query.get_or_404(str(person_id))
+        response.set_data(dumps(document(person, fields, includes)))
 
-    return Response(repr(person), mimetype="application/json", status=200)
+    return response
 
 
 @person.route("/<uuid:organisation_id>/people/<uuid:person_id>", methods=["PUT"])
@@ -161,41 +369,55 @@ def update(organisation_id, person_id):
 
     # Validate request against schema
     try:
-        validate(request.json, person_schema, format_checker=FormatChecker())
+        validate(request.json, "PersonRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    person = Person.query.get_or_404(str(person_id))
-
-    person.name = request.json["name"]
-    person.email_address = request.json["email_address"]
-    person.full_time_equivalent = request.json["full_time_equivalent"]
-    person.location_id = request.json["location_id"]
-    person.employment = request.json["employment"]
-    person.role_id = request.json["role_id"]
-    person.updated_at = datetime.utcnow()
-
-    db.session.add(person)
     try:
+        person = update_row(
+            Person,
+            str(person_id),
+            {
+                "name": request.json["name"],
+                "email_address": request.json["email_address"],
+                "full_time_equivalent": request.json["full_time_equivalent"],
+                "location_id": request.json["location_id"],
+                "employment": request.json["employment"],
+                "role_id": request.json["role_id"],
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Person, person.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(person), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "people")
+
+    response = Response(dumps(person.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @person.route("/<uuid:organisation_id>/people/<uuid:person_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, person_id):
     """Delete a Person with a specific ID."""
-    person = Person.query.get_or_404(str(person_id))
-
-    db.session.delete(person)
     try:
+        delete_row(Person, str(person_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "people")
+
     return Response(mimetype="application/json", status=204)
@@ -0,0 +1,204 @@
+import csv
+import io
+import queue
+import threading
+from itertools import islice
+
+import psycopg2.extensions
+from app import db
+from app.pagination import link_headers
+from app.streaming import CHUNK_SIZE
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import String, case, cast, column, func, insert, table, text
+
+
+class IteratorFile(io.TextIOBase):
+    """Read-only file over an iterator of strings, so that COPY ... FROM STDIN can consume a generator lazily."""
+
+    def __init__(self, iterator):
+        self.iterator = iter(iterator)
+        self.buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.iterator)
+            except StopIteration:
+                break
+
+        if size < 0:
+            chunk, self.buffer = self.buffer, ""
+        else:
+            chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+
+        return chunk
+
+
+def csv_lines(rows):
+    """Encode rows as lines of CSV, one at a time."""
+    data = io.StringIO()
+    w = csv.writer(data)
+    for row in rows:
+        w.writerow(row)
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+
+def staging_table(model):
+    """Create a temporary table with the same columns as a model's table, dropped when the transaction ends."""
+    name = f"{model.__tablename__}_staging"
+    db.session.execute(
+        text(f"CREATE TEMPORARY TABLE {name} (LIKE {model.__tablename__} INCLUDING DEFAULTS) ON COMMIT DROP")
+    )
+
+    return table(name, *[column(c.name) for c in model.__table__.columns])
+
+
+def green():
+    """Whether psycopg2 has a wait callback installed, as psycogreen does for gevent workers.
+
+    psycopg2 can't COPY while it has one, and it is process wide, so it's left alone and COPY isn't used instead.
+    """
+    return psycopg2.extensions.get_wait_callback() is not None
+
+
+def copy_from(staging, columns, rows):
+    """Load rows into a table with COPY ... FROM STDIN, in the session's transaction, as they are produced.
+
+    With a wait callback installed the rows are inserted in batches instead. Returns the number of rows loaded.
+    """
+    if green():
+        count = 0
+        rows = iter(rows)
+        while True:
+            batch = [dict(zip(columns, row)) for row in islice(rows, current_app.config["STREAM_BATCH_SIZE"])]
+            if not batch:
+                return count
+            db.session.execute(insert(staging), batch)
+            count += len(batch)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {staging.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        IteratorFile(csv_lines(rows)),
+    )
+
+    return cursor.rowcount
+
+
+class QueueFile(io.TextIOBase):
+    """Write-only file that passes what is written to a queue, in chunks, for COPY ... TO STDOUT to produce into."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.chunks.put("".join(self.buffer))
+            self.buffer = []
+            self.size = 0
+
+
+def isoformat(timestamp):
+    """Format a timestamp column in SQL like datetime.isoformat() formats it as psycopg2 reads it, in the session's time
+    zone and with microseconds only if there are any.
+    """
+    seconds = func.to_char(timestamp, 'YYYY-MM-DD"T"HH24:MI:SS', type_=String)
+    microseconds = func.to_char(timestamp, "US", type_=String)
+    offset = func.to_char(timestamp, "TZH:TZM", type_=String)
+
+    return seconds + case((microseconds == "000000", ""), else_="." + microseconds) + offset
+
+
+def floatformat(number):
+    """Format a float column in SQL like str() formats it in Python, where whole numbers have a fraction."""
+    text = cast(number, String)
+
+    return case((text.op("~")("^-?[0-9]+$"), text + ".0"), else_=text)
+
+
+def copy_export():
+    """Whether a list request should be answered with a CSV export produced by the database itself.
+
+    Not with a wait callback installed, when the export is built in Python instead.
+    """
+    if not current_app.config["CSV_EXPORT_COPY"] or green():
+        return False
+
+    accept = request.headers.getlist("accept")
+    return "text/csv" in accept and "application/json" not in accept
+
+
+def copy_to(query):
+    """Stream the results of a query as CSV, with a header row of its column labels, using COPY ... TO STDOUT.
+
+    psycopg2 can only COPY into a file, so the COPY runs in a thread on its own connection, writing into a bounded
+    queue that is drained as the response is sent.
+    """
+    connection = db.engine.raw_connection()
+    cursor = connection.cursor()
+    statement = query.statement.compile(dialect=db.engine.dialect)
+    sql = cursor.mogrify(str(statement), statement.params).decode()
+
+    chunks = queue.Queue(maxsize=current_app.config["CSV_EXPORT_QUEUE_SIZE"])
+
+    def copy():
+        output = QueueFile(chunks)
+        try:
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV HEADER", output)
+            output.flush()
+        except Exception as e:
+            chunks.put(e)
+        else:
+            chunks.put(None)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # If the client went away before the end, stop the COPY and unblock the thread so the connection can be reused
+        if thread.is_alive():
+            connection.connection.cancel()
+            while thread.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        connection.close()
+
+
+def copy_response(query, filename, next_cursor):
+    """Build a CSV export response streamed from COPY, or an empty response if there are no results."""
+    if not db.session.query(query.exists()).scalar():
+        return Response(mimetype="application/json", status=204)
+
+    response = Response(
+        stream_with_context(copy_to(query)), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename=filename)
+
+    return response
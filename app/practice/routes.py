@@ -1,80 +1,122 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
-from app.models import Organisation, Practice
+from app.batch import by_ids, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
+from app.models import Practice
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
 from app.practice import practice
-from flask import Response, request, url_for
+from app.projections import PracticeItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-practice_schema = openapi["components"]["schemas"]["PracticeRequest"]
+from jsonschema import ValidationError
+from werkzeug.exceptions import BadRequest, HTTPException, InternalServerError
 
 
 @practice.route("/<uuid:organisation_id>/practices", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("practices", "people", "roles", "grades", "locations")
 def list(organisation_id):
     """Get a list of Practices in an Organisation."""
+    fields = requested_fields("PracticeItem")
+    includes = requested_includes(Practice)
     name_query = request.args.get("name", type=str)
 
+    query = Practice.query.filter_by(organisation_id=str(organisation_id))
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, PracticeItem, ids, fields, includes)
+
     if name_query:
-        practices = (
-            Practice.query.filter(Practice.name.ilike(f"%{name_query}%"))
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Practice.name.asc())
-            .all()
+        query = query.filter(contains(Practice.name, name_query))
+
+    query, next_cursor = paginate(query, *sort_keys(Practice.name, name_query, Practice.name, Practice.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Practice.id.label("ID"),
+                Practice.name.label("NAME"),
+                Practice.cost_centre.label("COST_CENTRE"),
+                isoformat(Practice.created_at).label("CREATED_AT"),
+                isoformat(Practice.updated_at).label("UPDATED_AT"),
+            ),
+            "practices.csv",
+            next_cursor,
         )
-    else:
-        practices = Practice.query.filter_by(organisation_id=str(organisation_id)).order_by(Practice.name.asc()).all()
 
-    if practices:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [practice.list_item() for practice in practices]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "COST_CENTRE", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for practice in practices:
-                    w.writerow(
-                        (
-                            practice.id,
-                            practice.name,
-                            practice.cost_centre,
-                            practice.created_at.isoformat(),
-                            practice.updated_at.isoformat() if practice.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="practices.csv")
-            return response
-    else:
+    practices = load(query, PracticeItem, fields, includes)
+    if not practices:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(practices, Practice, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
+
+def csv_response(practices, next_cursor):
+    """Stream a page of Practices as CSV, or respond with no content if there are none."""
+    if not practices:
         return Response(mimetype="application/json", status=204)
 
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "COST_CENTRE", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for practice in practices:
+            w.writerow(
+                (
+                    practice.id,
+                    practice.name,
+                    practice.cost_centre,
+                    practice.created_at.isoformat(),
+                    practice.updated_at.isoformat() if practice.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="practices.csv")
+    return response
+
+
+@practice.route("/<uuid:organisation_id>/practices:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Practices in an Organisation by their IDs."""
+    query = Practice.query.filter_by(organisation_id=str(organisation_id))
+
+    return by_ids(query, PracticeItem, requested_ids(), requested_fields("PracticeItem"), requested_includes(Practice))
+
 
 @practice.route("/<uuid:organisation_id>/practices", methods=["POST"])
 @consumes("application/json")
@@ -84,7 +126,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, practice_schema, format_checker=FormatChecker())
+        validate(request.json, "PracticeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -102,7 +144,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(practice), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "practices")
+
+    response = Response(dumps(practice.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "practice.get",
         organisation_id=organisation_id,
@@ -114,11 +158,17 @@ def create(organisation_id):
 
 @practice.route("/<uuid:organisation_id>/practices/<uuid:practice_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "practices", "people", "roles", "grades", "locations")
 def get(organisation_id, practice_id):
     """Get a specific Practice in an Organisation."""
-    practice = Practice.query.get_or_404(str(practice_id))
+    fields = requested_fields("Practice")
+    includes = requested_includes(Practice)
+    response = conditional(Practice, str(practice_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        practice = Practice.query.options(*counts(fields)).get_or_404(str(practice_id))
+        response.set_data(dumps(document(practice, fields, includes)))
 
-    return Response(repr(practice), mimetype="application/json", status=200)
+    return response
 
 
 @practice.route("/<uuid:organisation_id>/practices/<uuid:practice_id>", methods=["PUT"])
@@ -126,42 +176,55 @@ def get(organisation_id, practice_id):
 @produces("application/json")
 def update(organisation_id, practice_id):
     """Update a Practice with a specific ID."""
-    organisation = Organisation.query.get_or_404(str(organisation_id))
 
     # Validate request against schema
     try:
-        validate(request.json, practice_schema, format_checker=FormatChecker())
+        validate(request.json, "PracticeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    practice = Practice.query.get_or_404(str(practice_id))
-
-    practice.name = request.json["name"]
-    practice.head_id = request.json["head_id"] if "head_id" in request.json else None
-    practice.cost_centre = (request.json["cost_centre"] if "cost_centre" in request.json else None,)
-    practice.updated_at = datetime.utcnow()
-
-    db.session.add(practice)
     try:
+        practice = update_row(
+            Practice,
+            str(practice_id),
+            {
+                "name": request.json["name"],
+                "head_id": request.json["head_id"] if "head_id" in request.json else None,
+                "cost_centre": request.json["cost_centre"] if "cost_centre" in request.json else None,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Practice, practice.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(practice), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "practices")
+
+    response = Response(dumps(practice.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @practice.route("/<uuid:organisation_id>/practices/<uuid:practice_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, practice_id):
     """Delete a Practice with a specific ID."""
-    practice = Practice.query.get_or_404(str(practice_id))
-
-    db.session.delete(practice)
     try:
+        delete_row(Practice, str(practice_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "practices", "roles", "people")
+
     return Response(mimetype="application/json", status=204)
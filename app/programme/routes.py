@@ -1,81 +1,122 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import by_ids, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.models import Programme
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
 from app.programme import programme
-from flask import Response, request, url_for
+from app.projections import ProgrammeItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-programme_schema = openapi["components"]["schemas"]["ProgrammeRequest"]
+from jsonschema import ValidationError
+from werkzeug.exceptions import BadRequest, HTTPException, InternalServerError
 
 
 @programme.route("/<uuid:organisation_id>/programmes", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("programmes", "people", "roles", "grades", "practices", "locations")
 def list(organisation_id):
     """Get a list of Programmes in an Organisation."""
+    fields = requested_fields("ProgrammeItem")
+    includes = requested_includes(Programme)
     name_query = request.args.get("name", type=str)
 
+    query = Programme.query.filter_by(organisation_id=str(organisation_id))
+
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, ProgrammeItem, ids, fields, includes)
+
     if name_query:
-        programmes = (
-            Programme.query.filter(Programme.name.ilike(f"%{name_query}%"))
-            .filter_by(organisation_id=str(organisation_id))
-            .order_by(Programme.name.asc())
-            .all()
-        )
-    else:
-        programmes = (
-            Programme.query.filter_by(organisation_id=str(organisation_id)).order_by(Programme.name.asc()).all()
+        query = query.filter(contains(Programme.name, name_query))
+
+    query, next_cursor = paginate(query, *sort_keys(Programme.name, name_query, Programme.name, Programme.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Programme.id.label("ID"),
+                Programme.name.label("NAME"),
+                isoformat(Programme.created_at).label("CREATED_AT"),
+                isoformat(Programme.updated_at).label("UPDATED_AT"),
+            ),
+            "programmes.csv",
+            next_cursor,
         )
 
-    if programmes:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [programme.list_item() for programme in programmes]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for programme in programmes:
-                    w.writerow(
-                        (
-                            programme.id,
-                            programme.name,
-                            programme.created_at.isoformat(),
-                            programme.updated_at.isoformat() if programme.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="programmes.csv")
-            return response
-    else:
+    programmes = load(query, ProgrammeItem, fields, includes)
+    if not programmes:
         return Response(mimetype="application/json", status=204)
 
+    return Response(
+        stream_with_context(list_document(programmes, Programme, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
+
+def csv_response(programmes, next_cursor):
+    """Stream a page of Programmes as CSV, or respond with no content if there are none."""
+    if not programmes:
+        return Response(mimetype="application/json", status=204)
+
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for programme in programmes:
+            w.writerow(
+                (
+                    programme.id,
+                    programme.name,
+                    programme.created_at.isoformat(),
+                    programme.updated_at.isoformat() if programme.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="programmes.csv")
+    return response
+
+
+@programme.route("/<uuid:organisation_id>/programmes:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Programmes in an Organisation by their IDs."""
+    query = Programme.query.filter_by(organisation_id=str(organisation_id))
+
+    return by_ids(
+        query, ProgrammeItem, requested_ids(), requested_fields("ProgrammeItem"), requested_includes(Programme)
+    )
+
 
 @programme.route("/<uuid:organisation_id>/programmes", methods=["POST"])
 @consumes("application/json")
@@ -85,7 +126,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, programme_schema, format_checker=FormatChecker())
+        validate(request.json, "ProgrammeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -102,7 +143,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(programme), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "programmes")
+
+    response = Response(dumps(programme.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "programme.get",
         organisation_id=organisation_id,
@@ -114,11 +157,17 @@ def create(organisation_id):
 
 @programme.route("/<uuid:organisation_id>/programmes/<uuid:programme_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "programmes", "people", "projects", "roles", "grades", "practices", "locations")
 def get(organisation_id, programme_id):
     """Get a specific Programme in an Organisation."""
-    programme = Programme.query.get_or_404(str(programme_id))
+    fields = requested_fields("Programme")
+    includes = requested_includes(Programme)
+    response = conditional(Programme, str(programme_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        programme = Programme.query.options(*counts(fields)).get_or_404(str(programme_id))
+        response.set_data(dumps(document(programme, fields, includes)))
 
-    return Response(repr(programme), mimetype="application/json", status=200)
+    return response
 
 
 @programme.route("/<uuid:organisation_id>/programmes/<uuid:programme_id>", methods=["PUT"])
@@ -129,37 +178,51 @@ def update(organisation_id, programme_id):
 
     # Validate request against schema
     try:
-        validate(request.json, programme_schema, format_checker=FormatChecker())
+        validate(request.json, "ProgrammeRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    programme = Programme.query.get_or_404(str(programme_id))
-
-    programme.name = request.json["name"]
-    programme.manager_id = request.json["manager_id"] if "manager_id" in request.json else None
-    programme.updated_at = datetime.utcnow()
-
-    db.session.add(programme)
     try:
+        programme = update_row(
+            Programme,
+            str(programme_id),
+            {
+                "name": request.json["name"],
+                "manager_id": request.json["manager_id"] if "manager_id" in request.json else None,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Programme, programme.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(programme), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "programmes")
+
+    response = Response(dumps(programme.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @programme.route("/<uuid:organisation_id>/programmes/<uuid:programme_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, programme_id):
     """Delete a Programme with a specific ID."""
-    programme = Programme.query.get_or_404(str(programme_id))
-
-    db.session.delete(programme)
     try:
+        delete_row(Programme, str(programme_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "programmes")
+
     return Response(mimetype="application/json", status=204)
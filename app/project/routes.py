@@ -1,26 +1,36 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import batch_items, build, by_ids, created, insert_all, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.models import Person, Project
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
 from app.project import project
-from flask import Response, request, url_for
+from app.projections import ProjectItem, load
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-project_schema = openapi["components"]["schemas"]["ProjectRequest"]
+from jsonschema import ValidationError
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, HTTPException, InternalServerError
 
 
 @project.route("/<uuid:organisation_id>/projects", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("projects", "people", "programmes", "roles", "grades", "practices", "locations")
 def list(organisation_id):
     """Get a list of Projects in an Organisation."""
+    fields = requested_fields("ProjectItem")
+    includes = requested_includes(Project)
     name_query = request.args.get("name", type=str)
     manager_filter = request.args.get("manager_id", type=str)
     programme_filter = request.args.get("programme_id", type=str)
@@ -28,8 +38,12 @@ def list(organisation_id):
 
     query = Project.query.filter(Project.organisation_id == str(organisation_id))
 
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, ProjectItem, ids, fields, includes)
+
     if name_query:
-        query = query.filter(Project.name.ilike(f"%{name_query}%"))
+        query = query.filter(contains(Project.name, name_query))
     if manager_filter:
         query = query.filter(Project.manager_id == manager_filter)
     if programme_filter:
@@ -37,50 +51,82 @@ def list(organisation_id):
     if status_filter:
         query = query.filter(Project.status == status_filter)
 
-    projects = query.order_by(Project.name.asc()).all()
+    query, next_cursor = paginate(query, *sort_keys(Project.name, name_query, Project.name, Project.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Project.id.label("ID"),
+                Project.name.label("NAME"),
+                Project.status.label("STATUS"),
+                isoformat(Project.created_at).label("CREATED_AT"),
+                isoformat(Project.updated_at).label("UPDATED_AT"),
+            ),
+            "projects.csv",
+            next_cursor,
+        )
 
-    if projects:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [project.list_item() for project in projects]
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "NAME", "STATUS", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for project in projects:
-                    w.writerow(
-                        (
-                            project.id,
-                            project.name,
-                            project.status,
-                            project.created_at.isoformat(),
-                            project.updated_at.isoformat() if project.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="projects.csv")
-            return response
-    else:
+    projects = load(query, ProjectItem, fields, includes)
+    if not projects:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(projects, Project, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
+
+
+def csv_response(projects, next_cursor):
+    """Stream a page of Projects as CSV, or respond with no content if there are none."""
+    if not projects:
         return Response(mimetype="application/json", status=204)
 
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "NAME", "STATUS", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for project in projects:
+            w.writerow(
+                (
+                    project.id,
+                    project.name,
+                    project.status,
+                    project.created_at.isoformat(),
+                    project.updated_at.isoformat() if project.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="projects.csv")
+    return response
+
+
+@project.route("/<uuid:organisation_id>/projects:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Projects in an Organisation by their IDs."""
+    query = Project.query.filter(Project.organisation_id == str(organisation_id))
+
+    return by_ids(query, ProjectItem, requested_ids(), requested_fields("ProjectItem"), requested_includes(Project))
+
 
 @project.route("/<uuid:organisation_id>/projects", methods=["POST"])
 @consumes("application/json")
@@ -90,7 +136,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, project_schema, format_checker=FormatChecker())
+        validate(request.json, "ProjectRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -109,7 +155,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(project), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "projects")
+
+    response = Response(dumps(project.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "project.get",
         organisation_id=organisation_id,
@@ -119,13 +167,51 @@ def create(organisation_id):
     return response
 
 
+@project.route("/<uuid:organisation_id>/projects:batch", methods=["POST"])
+@consumes("application/json", "application/x-ndjson")
+@produces("application/json")
+def batch(organisation_id):
+    """Create a batch of Projects in an Organisation, all or none of them."""
+    items = batch_items("ProjectRequest")
+    projects = build(
+        items,
+        lambda item: Project(
+            name=item["name"],
+            manager_id=item.get("manager_id"),
+            programme_id=item["programme_id"],
+            status=item["status"],
+            organisation_id=str(organisation_id),
+        ),
+    )
+
+    try:
+        ids = insert_all(Project, projects)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise Conflict("One or more items conflict with, or refer to missing, existing resources.")
+    except Exception:
+        db.session.rollback()
+        raise InternalServerError
+
+    cache.invalidate(organisation_id, "projects")
+
+    return created(ids)
+
+
 @project.route("/<uuid:organisation_id>/projects/<uuid:project_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "projects", "people", "programmes", "roles", "grades", "practices", "locations")
 def get(organisation_id, project_id):
     """Get a specific Project in an Organisation."""
-    project = Project.query.get_or_404(str(project_id))
+    fields = requested_fields("Project")
+    includes = requested_includes(Project)
+    response = conditional(Project, str(project_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        project = Project.query.get_or_404(str(project_id))
+        response.set_data(dumps(document(project, fields, includes)))
 
-    return Response(repr(project), mimetype="application/json", status=200)
+    return response
 
 
 @project.route("/<uuid:organisation_id>/projects/<uuid:project_id>", methods=["PUT"])
@@ -136,46 +222,61 @@ def update(organisation_id, project_id):
 
     # Validate request against schema
     try:
-        validate(request.json, project_schema, format_checker=FormatChecker())
+        validate(request.json, "ProjectRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    project = Project.query.get_or_404(str(project_id))
-
-    project.name = request.json["name"]
-    project.manager_id = request.json["manager_id"] if "manager_id" in request.json else None
-    project.programme_id = request.json["programme_id"]
-    project.status = request.json["status"]
-    project.updated_at = datetime.utcnow()
-
-    db.session.add(project)
     try:
+        project = update_row(
+            Project,
+            str(project_id),
+            {
+                "name": request.json["name"],
+                "manager_id": request.json["manager_id"] if "manager_id" in request.json else None,
+                "programme_id": request.json["programme_id"],
+                "status": request.json["status"],
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Project, project.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(project), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "projects")
+
+    response = Response(dumps(project.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @project.route("/<uuid:organisation_id>/projects/<uuid:project_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, project_id):
     """Delete a Project with a specific ID."""
-    project = Project.query.get_or_404(str(project_id))
-
-    db.session.delete(project)
     try:
+        delete_row(Project, str(project_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "projects")
+
     return Response(mimetype="application/json", status=204)
 
 
 @project.route("/<uuid:organisation_id>/projects/managers", methods=["GET"])
 @produces("application/json")
+@cache.cached("projects", "people")
 def managers(organisation_id):
     """Get a list of Project Managers in an Organisation."""
     manager_ids = [
@@ -189,7 +290,7 @@ def managers(organisation_id):
         managers = Person.query.filter(Person.id.in_(manager_ids)).order_by(Person.name.asc())
         results = [{"id": manager.id, "name": manager.name} for manager in managers]
         return Response(
-            json.dumps(results, separators=(",", ":")),
+            dumps(results),
             mimetype="application/json",
             status=200,
         )
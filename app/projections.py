@@ -0,0 +1,192 @@
+from collections import namedtuple
+
+from app import db
+from app.fields import sparse
+from app.models import Grade, Location, Organisation, Person, Practice, Programme, Project, Role
+from app.streaming import peek
+from flask import current_app
+from sqlalchemy import null
+
+
+def related(id, name):
+    """A related row as it's shown in a list item, or None if there isn't one."""
+    return {"id": id, "name": name} if id is not None else None
+
+
+class OrganisationItem(namedtuple("OrganisationItem", "id name domain")):
+    __slots__ = ()
+    model = Organisation
+    columns = (Organisation.id, Organisation.name, Organisation.domain)
+    joins = ()
+    fields = {}
+
+    def list_item(self, fields=None):
+        return sparse({"id": self.id, "name": self.name, "domain": self.domain}, fields)
+
+
+class LocationItem(namedtuple("LocationItem", "id name")):
+    __slots__ = ()
+    model = Location
+    columns = (Location.id, Location.name)
+    joins = ()
+    fields = {}
+
+    def list_item(self, fields=None):
+        return sparse({"id": self.id, "name": self.name}, fields)
+
+
+class GradeItem(namedtuple("GradeItem", "id name")):
+    __slots__ = ()
+    model = Grade
+    columns = (Grade.id, Grade.name)
+    joins = ()
+    fields = {}
+
+    def list_item(self, fields=None):
+        return sparse({"id": self.id, "name": self.name}, fields)
+
+
+class PracticeItem(namedtuple("PracticeItem", "id name head_id head_name")):
+    __slots__ = ()
+    model = Practice
+    columns = (Practice.id, Practice.name, Person.id, Person.name)
+    joins = ((Person, Practice.head_id == Person.id),)
+    fields = {"head": ("head_id", "head_name")}
+
+    def list_item(self, fields=None):
+        return sparse({"id": self.id, "name": self.name, "head": related(self.head_id, self.head_name)}, fields)
+
+
+class RoleItem(namedtuple("RoleItem", "id title grade_id grade_name practice_id practice_name")):
+    __slots__ = ()
+    model = Role
+    columns = (Role.id, Role.title, Grade.id, Grade.name, Practice.id, Practice.name)
+    joins = ((Grade, Role.grade_id == Grade.id), (Practice, Role.practice_id == Practice.id))
+    fields = {"grade": ("grade_id", "grade_name"), "practice": ("practice_id", "practice_name")}
+
+    def list_item(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "title": self.title,
+                "grade": {"id": self.grade_id, "name": self.grade_name},
+                "practice": related(self.practice_id, self.practice_name),
+            },
+            fields,
+        )
+
+
+class PersonItem(
+    namedtuple(
+        "PersonItem",
+        "id name role_id role_title grade_id grade_name practice_id practice_name location_id location_name",
+    )
+):
+    __slots__ = ()
+    model = Person
+    columns = (
+        Person.id,
+        Person.name,
+        Role.id,
+        Role.title,
+        Grade.id,
+        Grade.name,
+        Practice.id,
+        Practice.name,
+        Location.id,
+        Location.name,
+    )
+    joins = (
+        (Role, Person.role_id == Role.id),
+        (Grade, Role.grade_id == Grade.id),
+        (Practice, Role.practice_id == Practice.id),
+        (Location, Person.location_id == Location.id),
+    )
+    fields = {
+        "role": ("role_id", "role_title", "grade_id", "grade_name", "practice_id", "practice_name"),
+        "location": ("location_id", "location_name"),
+    }
+
+    def list_item(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "role": {
+                    "id": self.role_id,
+                    "title": self.role_title,
+                    "grade": {"id": self.grade_id, "name": self.grade_name},
+                    "practice": related(self.practice_id, self.practice_name),
+                },
+                "location": related(self.location_id, self.location_name),
+            },
+            fields,
+        )
+
+
+class ProgrammeItem(namedtuple("ProgrammeItem", "id name manager_id manager_name")):
+    __slots__ = ()
+    model = Programme
+    columns = (Programme.id, Programme.name, Person.id, Person.name)
+    joins = ((Person, Programme.manager_id == Person.id),)
+    fields = {"manager": ("manager_id", "manager_name")}
+
+    def list_item(self, fields=None):
+        return sparse(
+            {"id": self.id, "name": self.name, "manager": related(self.manager_id, self.manager_name)}, fields
+        )
+
+
+class ProjectItem(namedtuple("ProjectItem", "id name manager_id manager_name programme_id programme_name status")):
+    __slots__ = ()
+    model = Project
+    columns = (Project.id, Project.name, Person.id, Person.name, Programme.id, Programme.name, Project.status)
+    joins = ((Person, Project.manager_id == Person.id), (Programme, Project.programme_id == Programme.id))
+    fields = {"manager": ("manager_id", "manager_name"), "programme": ("programme_id", "programme_name")}
+
+    def list_item(self, fields=None):
+        return sparse(
+            {
+                "id": self.id,
+                "name": self.name,
+                "manager": related(self.manager_id, self.manager_name),
+                "programme": related(self.programme_id, self.programme_name),
+                "status": self.status,
+            },
+            fields,
+        )
+
+
+def projected(query, item, fields=None):
+    """Rewrite a list query to select only the columns of an item type that the requested fields need, outer joined to
+    the rows they name. Columns that aren't needed are selected as NULL.
+
+    An item type's fields map each list item field to the columns it's built from, where they aren't one and the same.
+    """
+    names = item._fields if fields is None else {name for field in fields for name in item.fields.get(field, (field,))}
+    columns = [column if name in names else null() for name, column in zip(item._fields, item.columns)]
+    tables = {column.table for name, column in zip(item._fields, item.columns) if name in names}
+
+    statement = query.statement.with_only_columns(*columns).select_from(item.model)
+    for target, onclause in item.joins:
+        if target.__table__ in tables:
+            statement = statement.outerjoin(target, onclause)
+
+    return statement
+
+
+def load(query, item, fields=None, includes=None):
+    """Iterate over the page of a list query as list items of a type, from a server-side cursor, without loading the
+    model instances. The columns of any relations to include are selected whether or not their fields are requested.
+
+    Returns None if there are no results, so that the caller can respond before anything is streamed.
+    """
+    if fields is not None and includes:
+        fields = fields | includes.keys()
+
+    result = db.session.execute(
+        projected(query, item, fields),
+        execution_options={"stream_results": True, "max_row_buffer": current_app.config["STREAM_BATCH_SIZE"]},
+    )
+
+    return peek(map(item._make, result))
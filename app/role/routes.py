@@ -1,82 +1,127 @@
 import csv
-import json
 from datetime import datetime
 from io import StringIO
 
 from app import db
+from app.batch import batch_items, build, by_ids, created, insert_all, requested_ids
+from app.cache import cache
+from app.conditional import conditional, delete_row, row_version, update_row
+from app.fields import counts, requested_fields
+from app.filters import contains, sort_keys
+from app.includes import document, list_document, requested_includes
 from app.models import Grade, Practice, Role
+from app.pagination import link_headers, paginate
+from app.pgcopy import copy_export, copy_response, isoformat
+from app.projections import RoleItem, load
 from app.role import role
-from flask import Response, request, url_for
+from app.schemas import validate
+from app.serializers import dumps
+from app.streaming import stream
+from flask import Response, request, stream_with_context, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
-from werkzeug.exceptions import BadRequest, InternalServerError
-
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-role_schema = openapi["components"]["schemas"]["RoleRequest"]
+from jsonschema import ValidationError
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, HTTPException, InternalServerError
 
 
 @role.route("/<uuid:organisation_id>/roles", methods=["GET"])
 @produces("application/json", "text/csv")
+@cache.cached("roles", "grades", "practices", "people", "locations")
 def list(organisation_id):
     """Get a list of Roles."""
+    fields = requested_fields("RoleItem")
+    includes = requested_includes(Role)
     title_query = request.args.get("title", type=str)
     grade_filter = request.args.get("grade_id", type=str)
     practice_filter = request.args.get("practice_id", type=str)
 
     query = Role.query.filter(Role.organisation_id == str(organisation_id))
 
+    ids = requested_ids()
+    if ids is not None:
+        return by_ids(query, RoleItem, ids, fields, includes)
+
     if title_query:
-        query = query.filter(Role.title.ilike(f"%{title_query}%"))
+        query = query.filter(contains(Role.title, title_query))
     if grade_filter:
         query = query.filter(Role.grade_id == grade_filter)
     if practice_filter:
         query = query.filter(Role.practice_id == practice_filter)
 
-    roles = query.order_by(Role.title.asc()).all()
+    query, next_cursor = paginate(query, *sort_keys(Role.title, title_query, Role.title, Role.id))
+
+    if copy_export():
+        return copy_response(
+            query.with_entities(
+                Role.id.label("ID"),
+                Role.title.label("TITLE"),
+                isoformat(Role.created_at).label("CREATED_AT"),
+                isoformat(Role.updated_at).label("UPDATED_AT"),
+            ),
+            "roles.csv",
+            next_cursor,
+        )
+
+    if "application/json" not in request.headers.getlist("accept"):
+        return csv_response(stream(query), next_cursor)
+
+    roles = load(query, RoleItem, fields, includes)
+    if not roles:
+        return Response(mimetype="application/json", status=204)
+
+    return Response(
+        stream_with_context(list_document(roles, Role, fields, includes)),
+        mimetype="application/json",
+        status=200,
+        headers=link_headers(next_cursor),
+    )
 
-    if roles:
-        if "application/json" in request.headers.getlist("accept"):
-            results = [role.list_item() for role in roles]
 
-            return Response(
-                json.dumps(results, separators=(",", ":")),
-                mimetype="application/json",
-                status=200,
-            )
-        elif "text/csv" in request.headers.getlist("accept"):
-
-            def generate():
-                data = StringIO()
-                w = csv.writer(data)
-
-                # write header
-                w.writerow(("ID", "TITLE", "CREATED_AT", "UPDATED_AT"))
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
-
-                # write each item
-                for role in roles:
-                    w.writerow(
-                        (
-                            role.id,
-                            role.title,
-                            role.created_at.isoformat(),
-                            role.updated_at.isoformat() if role.updated_at else None,
-                        )
-                    )
-                    yield data.getvalue()
-                    data.seek(0)
-                    data.truncate(0)
-
-            response = Response(generate(), mimetype="text/csv", status=200)
-            response.headers.set("Content-Disposition", "attachment", filename="roles.csv")
-            return response
-    else:
+def csv_response(roles, next_cursor):
+    """Stream a page of Roles as CSV, or respond with no content if there are none."""
+    if not roles:
         return Response(mimetype="application/json", status=204)
 
+    def generate():
+        data = StringIO()
+        w = csv.writer(data, lineterminator="\n")
+
+        # write header
+        w.writerow(("ID", "TITLE", "CREATED_AT", "UPDATED_AT"))
+        yield data.getvalue()
+        data.seek(0)
+        data.truncate(0)
+
+        # write each item
+        for role in roles:
+            w.writerow(
+                (
+                    role.id,
+                    role.title,
+                    role.created_at.isoformat(),
+                    role.updated_at.isoformat() if role.updated_at else None,
+                )
+            )
+            yield data.getvalue()
+            data.seek(0)
+            data.truncate(0)
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/csv", status=200, headers=link_headers(next_cursor)
+    )
+    response.headers.set("Content-Disposition", "attachment", filename="roles.csv")
+    return response
+
+
+@role.route("/<uuid:organisation_id>/roles:batchGet", methods=["POST"])
+@consumes("application/json")
+@produces("application/json")
+def batch_get(organisation_id):
+    """Get a batch of Roles in an Organisation by their IDs."""
+    query = Role.query.filter(Role.organisation_id == str(organisation_id))
+
+    return by_ids(query, RoleItem, requested_ids(), requested_fields("RoleItem"), requested_includes(Role))
+
 
 @role.route("/<uuid:organisation_id>/roles", methods=["POST"])
 @consumes("application/json")
@@ -86,7 +131,7 @@ def create(organisation_id):
 
     # Validate request against schema
     try:
-        validate(request.json, role_schema, format_checker=FormatChecker())
+        validate(request.json, "RoleRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
@@ -106,7 +151,9 @@ def create(organisation_id):
         db.session.rollback()
         raise InternalServerError
 
-    response = Response(repr(role), mimetype="application/json", status=201)
+    cache.invalidate(organisation_id, "roles")
+
+    response = Response(dumps(role.as_dict()), mimetype="application/json", status=201)
     response.headers["Location"] = url_for(
         "role.get",
         organisation_id=organisation_id,
@@ -116,13 +163,50 @@ def create(organisation_id):
     return response
 
 
+@role.route("/<uuid:organisation_id>/roles:batch", methods=["POST"])
+@consumes("application/json", "application/x-ndjson")
+@produces("application/json")
+def batch(organisation_id):
+    """Create a batch of Roles in an Organisation, all or none of them."""
+    items = batch_items("RoleRequest")
+    roles = build(
+        items,
+        lambda item: Role(
+            title=item["title"],
+            grade_id=item["grade_id"],
+            practice_id=item.get("practice_id"),
+            organisation_id=str(organisation_id),
+        ),
+    )
+
+    try:
+        ids = insert_all(Role, roles)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise Conflict("One or more items conflict with, or refer to missing, existing resources.")
+    except Exception:
+        db.session.rollback()
+        raise InternalServerError
+
+    cache.invalidate(organisation_id, "roles")
+
+    return created(ids)
+
+
 @role.route("/<uuid:organisation_id>/roles/<uuid:role_id>", methods=["GET"])
 @produces("application/json")
+@cache.cached("organisation", "roles", "grades", "practices", "people", "locations")
 def get(organisation_id, role_id):
     """Get a specific Role."""
-    role = Role.query.get_or_404(str(role_id))
+    fields = requested_fields("Role")
+    includes = requested_includes(Role)
+    response = conditional(Role, str(role_id), fields, validators=includes is None)
+    if response.status_code == 200:
+        role = Role.query.options(*counts(fields)).get_or_404(str(role_id))
+        response.set_data(dumps(document(role, fields, includes)))
 
-    return Response(repr(role), mimetype="application/json", status=200)
+    return response
 
 
 @role.route("/<uuid:organisation_id>/roles/<uuid:role_id>", methods=["PUT"])
@@ -133,38 +217,52 @@ def update(organisation_id, role_id):
 
     # Validate request against schema
     try:
-        validate(request.json, role_schema, format_checker=FormatChecker())
+        validate(request.json, "RoleRequest")
     except ValidationError as e:
         raise BadRequest(e.message)
 
-    role = Role.query.get_or_404(str(role_id))
-
-    role.title = request.json["title"]
-    role.grade_id = request.json["grade_id"]
-    role.practice_id = request.json["practice_id"] if "practice_id" in request.json else None
-    role.updated_at = datetime.utcnow()
-
-    db.session.add(role)
     try:
+        role = update_row(
+            Role,
+            str(role_id),
+            {
+                "title": request.json["title"],
+                "grade_id": request.json["grade_id"],
+                "practice_id": request.json["practice_id"] if "practice_id" in request.json else None,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        etag, _ = row_version(Role, role.id)
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
-    return Response(repr(role), mimetype="application/json", status=200)
+    cache.invalidate(organisation_id, "roles")
+
+    response = Response(dumps(role.as_dict()), mimetype="application/json", status=200)
+    response.set_etag(etag)
+
+    return response
 
 
 @role.route("/<uuid:organisation_id>/roles/<uuid:role_id>", methods=["DELETE"])
 @produces("application/json")
 def delete(organisation_id, role_id):
     """Delete a Role with a specific ID."""
-    role = Role.query.get_or_404(str(role_id))
-
-    db.session.delete(role)
     try:
+        delete_row(Role, str(role_id))
         db.session.commit()
+    except HTTPException:
+        db.session.rollback()
+        raise
     except Exception:
         db.session.rollback()
         raise InternalServerError
 
+    cache.invalidate(organisation_id, "roles", "people")
+
     return Response(mimetype="application/json", status=204)
@@ -0,0 +1,27 @@
+import json
+import os
+
+from jsonschema import Draft7Validator, FormatChecker
+from jsonschema.exceptions import best_match
+
+OPENAPI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "openapi.json")
+
+# OpenAPI specification, loaded once at startup
+with open(OPENAPI_PATH) as json_file:
+    openapi = json.load(json_file)
+
+format_checker = FormatChecker()
+
+# Validators for each request schema, with the schema itself checked once here rather than on every request
+validators = {}
+for name, schema in openapi["components"]["schemas"].items():
+    if name.endswith("Request"):
+        Draft7Validator.check_schema(schema)
+        validators[name] = Draft7Validator(schema, format_checker=format_checker)
+
+
+def validate(instance, schema_name):
+    """Validate an instance against a named request schema, raising the most relevant ValidationError."""
+    error = best_match(validators[schema_name].iter_errors(instance))
+    if error is not None:
+        raise error
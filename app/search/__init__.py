@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+search = Blueprint("search", __name__)
+
+from app.search import routes  # noqa: E402, F401
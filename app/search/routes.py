@@ -0,0 +1,89 @@
+from app import db
+from app.cache import cache
+from app.filters import escape_like
+from app.models import Grade, Location, Person, Practice, Programme, Project, Role
+from app.projections import GradeItem, LocationItem, PersonItem, PracticeItem, ProgrammeItem, ProjectItem, RoleItem
+from app.search import search
+from app.serializers import dumps
+from flask import Response, current_app, request
+from flask_negotiate import produces
+from psycopg2.errors import QueryCanceled
+from sqlalchemy import func, literal, union_all
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+
+# Searchable types, with the list item type they're shown as and the column matched
+TYPES = {
+    "grades": (GradeItem, Grade.name),
+    "locations": (LocationItem, Location.name),
+    "people": (PersonItem, Person.name),
+    "practices": (PracticeItem, Practice.name),
+    "programmes": (ProgrammeItem, Programme.name),
+    "projects": (ProjectItem, Project.name),
+    "roles": (RoleItem, Role.title),
+}
+
+
+def matches(type, organisation_id, prefix, limit):
+    """Select the top matches of a type, with the columns of their list items as a JSON array, as the types' items
+    have different columns and can't otherwise be combined in one statement.
+    """
+    item, column = TYPES[type]
+    model = item.model
+    statement = (
+        db.select(
+            literal(type).label("type"),
+            func.lower(column).label("sort_name"),
+            model.id.label("id"),
+            func.json_build_array(*item.columns).label("item"),
+        )
+        .select_from(model)
+        .where(model.organisation_id == str(organisation_id), func.lower(column).like(prefix, escape="\\"))
+    )
+    for target, onclause in item.joins:
+        statement = statement.outerjoin(target, onclause)
+
+    return statement.order_by(func.lower(column), model.id).limit(limit)
+
+
+@search.route("/<uuid:organisation_id>/search", methods=["GET"])
+@produces("application/json")
+@cache.cached("grades", "locations", "people", "practices", "programmes", "projects", "roles")
+def get(organisation_id):
+    """Find the items of each type in an Organisation whose names start with a query, for type-ahead."""
+    query = request.args.get("q", default="", type=str).strip()
+    if not query:
+        raise BadRequest("q must not be empty.")
+
+    types = request.args.get("types", type=str)
+    types = types.split(",") if types else [*TYPES]
+    if any(type not in TYPES for type in types):
+        raise BadRequest(f"types must be a comma separated list of {', '.join(TYPES)}.")
+
+    maximum = current_app.config["SEARCH_MAX_LIMIT"]
+    limit = request.args.get("limit", default=str(current_app.config["SEARCH_DEFAULT_LIMIT"]), type=str)
+    if not limit.isdigit() or not 1 <= int(limit) <= maximum:
+        raise BadRequest(f"limit must be an integer between 1 and {maximum}.")
+
+    # The top matches of every type and the columns of their list items, in one statement, each served by its
+    # (organisation_id, lower(name)) index
+    prefix = f"{escape_like(query.lower())}%"
+    statement = union_all(
+        *[matches(type, organisation_id, prefix, int(limit)) for type in TYPES if type in types]
+    ).order_by("type", "sort_name", "id")
+
+    results = {type: [] for type in types}
+    try:
+        # Cap the time spent on every statement from here to the end of the request's transaction
+        db.session.execute(
+            db.select(func.set_config("statement_timeout", str(current_app.config["SEARCH_TIMEOUT"]), True))
+        )
+        for match in db.session.execute(statement):
+            results[match.type].append(TYPES[match.type][0]._make(match.item).list_item())
+    except OperationalError as e:
+        db.session.rollback()
+        if isinstance(e.orig, QueryCanceled):
+            raise ServiceUnavailable("Search took too long. Try a longer query.")
+        raise
+
+    return Response(dumps(results), mimetype="application/json", status=200)
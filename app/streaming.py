@@ -0,0 +1,42 @@
+import itertools
+
+from app.serializers import dumps
+from flask import current_app
+
+# Flush encoded JSON to the client once this many bytes have been buffered
+CHUNK_SIZE = 65536
+
+
+def stream(query):
+    """Iterate over the results of a query from a server-side cursor, a batch of rows at a time.
+
+    Returns None if there are no results, so that the caller can respond before anything is streamed.
+    """
+    return peek(query.yield_per(current_app.config["STREAM_BATCH_SIZE"]))
+
+
+def peek(rows):
+    """Check that an iterable has any rows without losing the first, returning None if it's empty."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None
+
+    return itertools.chain([first], rows)
+
+
+def json_array(items):
+    """Encode an iterable of items as a JSON array, in chunks, without holding the whole array in memory."""
+    chunk = [b"["]
+    size = 1
+    for index, item in enumerate(items):
+        encoded = dumps(item)
+        chunk.append(b"," + encoded if index else encoded)
+        size += len(encoded) + 1
+        if size >= CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk = []
+            size = 0
+    chunk.append(b"]")
+
+    yield b"".join(chunk)
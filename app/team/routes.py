@@ -1,4 +1,3 @@
-import json
 from datetime import datetime
 
 from app import db
@@ -7,15 +6,10 @@ from app import db
 from app.team import team
 from flask import Response, request, url_for
 from flask_negotiate import consumes, produces
-from jsonschema import FormatChecker, ValidationError, validate
+from jsonschema import ValidationError
 from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import BadRequest, Conflict, NotImplemented
 
-# JSON schema for organisation requests
-with open("openapi.json") as json_file:
-    openapi = json.load(json_file)
-team_schema = openapi["components"]["schemas"]["TeamRequest"]
-
 
 @team.route("/<uuid:organisation_id>/teams", methods=["GET"])
 @produces("application/json", "text/csv")
@@ -0,0 +1,18 @@
+import logging
+
+from config import Config
+
+
+class BenchmarkConfig(Config):
+    RATELIMIT_ENABLED = False
+    RESPONSE_CACHE_ENABLED = False
+
+
+def create_benchmark_app():
+    """Create the app to benchmark, without the rate limiter or response cache, and only logging errors."""
+    from app import create_app
+
+    app = create_app(BenchmarkConfig)
+    app.logger.setLevel(logging.ERROR)
+
+    return app
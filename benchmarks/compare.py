@@ -0,0 +1,73 @@
+"""Compare two benchmark results files, and fail if any scenario got slower or runs more SQL statements.
+
+A scenario has regressed if its 95th percentile latency grew by more than the threshold, and by more than the noise
+floor, or if it now runs more statements per request.
+
+    python -m benchmarks.compare benchmarks/results/10k-base.json benchmarks/results/10k-head.json
+"""
+import argparse
+import json
+import sys
+
+
+def regressions(base, head, threshold, noise):
+    """Compare the scenarios in two sets of results, returning a row for each and the names of those that regressed."""
+    rows = []
+    regressed = []
+    for name, result in head["scenarios"].items():
+        before = base["scenarios"].get(name)
+        if before is None:
+            rows.append((name, None, result["p95_ms"], None, None, result["queries"], ""))
+            continue
+
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        slower = change > threshold and result["p95_ms"] - before["p95_ms"] > noise
+        more_queries = result["queries"] > before["queries"]
+        if slower or more_queries:
+            regressed.append(name)
+        rows.append(
+            (
+                name,
+                before["p95_ms"],
+                result["p95_ms"],
+                change,
+                before["queries"],
+                result["queries"],
+                "REGRESSED" if slower or more_queries else "",
+            )
+        )
+
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base", help="results to compare against")
+    parser.add_argument("head", help="results to check")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2, help="allowed relative growth in p95 latency")
+    parser.add_argument("--noise", type=float, default=1.0, help="growth in p95 latency always allowed, in ms")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    if (base["size"], base["seed"]) != (head["size"], head["seed"]):
+        sys.exit("Results are for different data and can't be compared.")
+
+    rows, regressed = regressions(base, head, args.threshold, args.noise)
+
+    print(f"{'scenario':<24}{'base p95':>10}{'head p95':>10}{'change':>10}{'base q':>8}{'head q':>8}")
+    for name, before, after, change, before_queries, after_queries, flag in rows:
+        print(
+            f"{name:<24}{before if before is not None else '-':>10}{after:>10}"
+            f"{f'{change:+.0%}' if change is not None else 'new':>10}"
+            f"{before_queries if before_queries is not None else '-':>8}{after_queries:>8}  {flag}"
+        )
+
+    if regressed:
+        sys.exit(f"{len(regressed)} scenarios regressed: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
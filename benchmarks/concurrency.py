@@ -0,0 +1,132 @@
+"""Compare the throughput of gunicorn's sync and gevent workers under many concurrent clients.
+
+Starts gunicorn with each worker class in turn, with the same number of workers, and has every client send requests
+for a list endpoint in a generated organisation over its own keep-alive connection for a fixed time. The rate limiter
+and response cache are turned off for the servers.
+
+    python -m benchmarks.concurrency --size 10k --clients 200
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess  # nosec - only runs gunicorn
+import sys
+import threading
+import time
+
+from benchmarks import create_benchmark_app
+from benchmarks.generate import SIZES, generate
+
+
+def serve(worker_class, workers, port):
+    """Start gunicorn with a worker class, and wait until it's accepting requests."""
+    env = {**os.environ, "GUNICORN_WORKER_CLASS": worker_class, "RATELIMIT_ENABLED": "false"}
+    env.pop("RESPONSE_CACHE_ENABLED", None)
+    server = subprocess.Popen(  # nosec - fixed command
+        [sys.executable, "-m", "gunicorn", "flux_api:app", "-w", str(workers), "-b", f"127.0.0.1:{port}"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/openapi")
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f"gunicorn with {worker_class} workers didn't start")
+
+
+def load(port, path, clients, duration):
+    """Send requests from a number of concurrent clients for a time, and summarise their latency and throughput."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    stop = start + duration
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.perf_counter() < stop:
+            request_start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={"Accept": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                ok = False
+            with lock:
+                (latencies if ok else errors).append((time.perf_counter() - request_start) * 1000)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else [0] * 99
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="1k", help="number of people in the organisation")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random data")
+    parser.add_argument("-c", "--clients", type=int, default=200, help="concurrent clients")
+    parser.add_argument("-d", "--duration", type=float, default=30, help="seconds to send requests for")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="port to serve on")
+    parser.add_argument("--resource", default="people", help="resource to list")
+    parser.add_argument("--worker-class", action="append", help="worker classes to compare, sync and gevent by default")
+    parser.add_argument("-o", "--output", help="results file")
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    with app.app_context():
+        organisation_id = generate(SIZES[args.size], args.seed)
+    path = f"/v1/organisations/{organisation_id}/{args.resource}"
+
+    results = {"size": args.size, "seed": args.seed, "clients": args.clients, "workers": args.workers, "path": path}
+    print(f"{'workers':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for worker_class in args.worker_class or ["sync", "gevent"]:
+        server = serve(worker_class, args.workers, args.port)
+        try:
+            result = load(args.port, path, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        results[worker_class] = result
+        print(
+            f"{worker_class:<10}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+            f"{result['p99_ms']:>10.2f}{result['errors']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Generate a synthetic organisation to benchmark against.
+
+Builds an organisation of a given number of people, with grades, practices, roles, locations, programmes and projects in
+realistic proportions. The same size and seed always produce the same data, so results can be compared between runs
+and commits. An organisation that has already been generated is reused.
+
+    python -m benchmarks.generate --size 10k
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app import db
+from app.models import Grade, Location, Organisation, Person, Practice, Programme, Project, Role
+from app.pgcopy import copy_from
+from sqlalchemy import bindparam, insert, update
+
+from benchmarks import create_benchmark_app
+
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+
+GRADES = [
+    "Administrative Assistant",
+    "Administrative Officer",
+    "Executive Officer",
+    "Higher Executive Officer",
+    "Senior Executive Officer",
+    "Grade 7",
+    "Grade 6",
+    "Deputy Director",
+    "Director",
+    "Director General",
+]
+DISCIPLINES = [
+    "Architecture",
+    "Business Analysis",
+    "Content Design",
+    "Data Science",
+    "Delivery",
+    "Finance",
+    "Interaction Design",
+    "Operations",
+    "Product Management",
+    "Quality Assurance",
+    "Research",
+    "Security",
+    "Service Design",
+    "Software Development",
+    "Technical Writing",
+]
+ROLES = ["Associate {}", "{}", "Senior {}", "Lead {}", "Head Of {}"]
+FIRST_NAMES = (
+    "Aisha Alex Amir Ben Chloe Chen Daniel Emma Fatima George Grace Hannah Harry Isla Jack James Jessica "
+    "Joshua Katie Leo Lily Lucy Mohammed Noah Olivia Oscar Priya Rachel Ruby Sam Sophie Thomas Wei "
+    "William Yusuf Zara"
+).split()
+LAST_NAMES = (
+    "Ahmed Baker Brown Campbell Clarke Davies Evans Green Hall Hughes Jackson Johnson Jones Khan Lewis "
+    "Martin Morgan Patel Roberts Robinson Singh Smith Taylor Thomas Thompson Walker White Williams Wilson "
+    "Wood Wright Young"
+).split()
+TOWNS = (
+    "Birmingham Bristol Cardiff Edinburgh Glasgow Leeds Liverpool London Manchester Newcastle Newport "
+    "Norwich Nottingham Sheffield Southampton Swansea Wigan York"
+).split()
+STATUSES = ["active", "active", "active", "paused", "closed"]
+
+# Every generated row has the same creation time, so that the data is the same whenever it is generated
+CREATED_AT = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def domain(size, seed):
+    return f"benchmark-{size}-{seed}.example.com"
+
+
+def generate(size, seed):
+    """Generate an organisation of a number of people, unless it already exists, and return its ID."""
+    existing = Organisation.query.filter_by(domain=domain(size, seed)).first()
+    if existing is not None:
+        return existing.id
+
+    rng = random.Random(domain(size, seed))  # nosec - reproducible test data
+
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    organisation_id = new_id()
+    grades = [(new_id(), name) for name in GRADES]
+    practices = [(new_id(), f"{rng.choice(DISCIPLINES)} {index + 1}") for index in range(max(5, size // 200))]
+    roles = [
+        (new_id(), template.format(practice_name), grades[min(level * 2 + rng.randrange(2), len(grades) - 1)][0], id)
+        for id, practice_name in practices
+        for level, template in enumerate(ROLES)
+    ]
+    locations = []
+    for index in range(max(5, size // 500)):
+        town = rng.choice(TOWNS)
+        locations.append((new_id(), f"{town} {index + 1}", f"{index + 1} High Street, {town}"))
+    people = []
+    for index in range(size):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        people.append(
+            (
+                new_id(),
+                f"{first_name} {last_name}",
+                f"{first_name}.{last_name}.{index}@{domain(size, seed)}".lower(),
+                rng.choice(roles)[0],
+                rng.choice(locations)[0],
+                rng.choice(["permanent", "permanent", "permanent", "contract"]),
+                rng.choice([1.0, 1.0, 1.0, 0.8, 0.6, 0.5]),
+            )
+        )
+    programmes = [(new_id(), f"Programme {index + 1}", rng.choice(people)[0]) for index in range(max(3, size // 1000))]
+    projects = [
+        (new_id(), f"Project {index + 1}", rng.choice(people)[0], rng.choice(programmes)[0], rng.choice(STATUSES))
+        for index in range(max(10, size // 20))
+    ]
+
+    db.session.execute(
+        insert(Organisation).values(
+            id=organisation_id, name=f"Benchmark {size} {seed}", domain=domain(size, seed), created_at=CREATED_AT
+        )
+    )
+    load(Grade, ["id", "name"], grades, organisation_id)
+    load(Practice, ["id", "name"], practices, organisation_id)
+    load(Role, ["id", "title", "grade_id", "practice_id"], roles, organisation_id)
+    load(Location, ["id", "name", "address"], locations, organisation_id)
+    load(
+        Person,
+        ["id", "name", "email_address", "role_id", "location_id", "employment", "full_time_equivalent"],
+        people,
+        organisation_id,
+    )
+    load(Programme, ["id", "name", "manager_id"], programmes, organisation_id)
+    load(Project, ["id", "name", "manager_id", "programme_id", "status"], projects, organisation_id)
+
+    # Practices need people to head them, who need roles in the practices
+    db.session.execute(
+        update(Practice.__table__).where(Practice.id == bindparam("practice_id")).values(head_id=bindparam("head_id")),
+        [{"practice_id": id, "head_id": rng.choice(people)[0]} for id, _ in practices],
+    )
+    db.session.commit()
+
+    return organisation_id
+
+
+def load(model, columns, rows, organisation_id):
+    """Write rows into a model's table with COPY, adding the columns every model has."""
+    copy_from(
+        model.__table__,
+        columns + ["organisation_id", "created_at"],
+        ([*row, organisation_id, CREATED_AT] for row in rows),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="1k", help="number of people in the organisation")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random data")
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    with app.app_context():
+        start = time.perf_counter()
+        organisation_id = generate(SIZES[args.size], args.seed)
+        print(f"Organisation {organisation_id} ready in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Benchmark the latency and throughput of every resource's list, get, create and update endpoints.
+
+Requests are made in-process through the Flask test client against a generated organisation, so results measure the
+app and the database rather than the network. Each scenario's latency percentiles, throughput and SQL statements per
+request are written to a JSON file to compare with another run's by using benchmarks.compare.
+
+Writes are made in the generated organisation, which grows a little with every run.
+
+    python -m benchmarks.run --size 10k
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess  # nosec - only runs git
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.instrumentation import count_queries
+from app.models import Grade, Location, Organisation, Person, Practice, Programme, Project, Role
+
+from benchmarks import create_benchmark_app
+from benchmarks.generate import SIZES, generate
+
+HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
+
+
+def first(model, organisation_id):
+    """Get the same item of a type in the generated organisation every time."""
+    return model.query.filter_by(organisation_id=organisation_id).order_by(model.id).first()
+
+
+def scenarios(organisation_id):
+    """Build the scenarios to run, as (name, method, URL, body factory) tuples.
+
+    Body factories are given a number unique within the run, for the fields that must be unique.
+    """
+    run = uuid.uuid4().hex[:8]
+    organisation = Organisation.query.get(organisation_id)
+    grade = first(Grade, organisation_id)
+    location = first(Location, organisation_id)
+    person = first(Person, organisation_id)
+    practice = first(Practice, organisation_id)
+    programme = first(Programme, organisation_id)
+    project = first(Project, organisation_id)
+    role = first(Role, organisation_id)
+    organisation_url = f"/v1/organisations/{organisation_id}"
+
+    resources = [
+        (
+            "organisations",
+            "/v1/organisations",
+            organisation.id,
+            lambda n: {"name": f"Organisation {run} {n}", "domain": f"{run}-{n}.example.com"},
+            lambda n: {"name": organisation.name, "domain": organisation.domain},
+        ),
+        ("grades", f"{organisation_url}/grades", grade.id, lambda n: {"name": f"Grade {run} {n}"}, None),
+        (
+            "locations",
+            f"{organisation_url}/locations",
+            location.id,
+            lambda n: {"name": f"Location {run} {n}", "address": f"{n} High Street"},
+            None,
+        ),
+        (
+            "people",
+            f"{organisation_url}/people",
+            person.id,
+            lambda n: {
+                "name": f"Person {run} {n}",
+                "email_address": f"person.{run}.{n}@example.com",
+                "role_id": role.id,
+                "location_id": location.id,
+                "employment": "permanent",
+                "full_time_equivalent": 1.0,
+            },
+            lambda n: {
+                "name": person.name,
+                "email_address": person.email_address,
+                "role_id": person.role_id,
+                "location_id": person.location_id,
+                "employment": person.employment,
+                "full_time_equivalent": person.full_time_equivalent,
+            },
+        ),
+        (
+            "practices",
+            f"{organisation_url}/practices",
+            practice.id,
+            lambda n: {"name": f"Practice {run} {n}", "head_id": person.id},
+            None,
+        ),
+        (
+            "programmes",
+            f"{organisation_url}/programmes",
+            programme.id,
+            lambda n: {"name": f"Programme {run} {n}", "manager_id": person.id},
+            None,
+        ),
+        (
+            "projects",
+            f"{organisation_url}/projects",
+            project.id,
+            lambda n: {
+                "name": f"Project {run} {n}",
+                "manager_id": person.id,
+                "programme_id": programme.id,
+                "status": "active",
+            },
+            None,
+        ),
+        (
+            "roles",
+            f"{organisation_url}/roles",
+            role.id,
+            lambda n: {"title": f"Role {run} {n}", "grade_id": grade.id, "practice_id": practice.id},
+            None,
+        ),
+    ]
+
+    for resource, url, id, create_body, update_body in resources:
+        yield f"{resource}.list", "GET", url, None
+        yield f"{resource}.get", "GET", f"{url}/{id}", None
+        yield f"{resource}.create", "POST", url, create_body
+        yield f"{resource}.update", "PUT", f"{url}/{id}", update_body or create_body
+
+    # A roster of people fetched in one request, rather than one request each
+    roster = [
+        id for (id,) in Person.query.with_entities(Person.id).filter_by(organisation_id=organisation_id).limit(100)
+    ]
+    yield "people.batch_get", "POST", f"{organisation_url}/people:batchGet", lambda n: {"ids": roster}
+
+    yield "search.get", "GET", f"{organisation_url}/search?q=ja", None
+
+
+def measure(client, method, url, body, requests, warmup):
+    """Make a number of requests after a warm up, and summarise their latency, throughput and SQL statements."""
+    counter = itertools.count()
+    latencies = []
+
+    def send():
+        response = client.open(
+            url, method=method, headers=HEADERS, data=json.dumps(body(next(counter))) if body else None
+        )
+        response.get_data()
+        response.close()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} failed with {response.status_code}: {response.get_data(as_text=True)}")
+
+    for _ in range(warmup):
+        send()
+
+    with count_queries() as queries:
+        start = time.perf_counter()
+        for _ in range(requests):
+            request_start = time.perf_counter()
+            send()
+            latencies.append((time.perf_counter() - request_start) * 1000)
+        duration = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        "requests": requests,
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "max_ms": round(max(latencies), 3),
+        "throughput": round(requests / duration, 1),
+        "queries": round(queries.count / requests, 2),
+    }
+
+
+def commit():
+    """Get the commit being benchmarked, if running in a git checkout."""
+    try:
+        return subprocess.run(  # nosec - fixed command
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="1k", help="number of people in the organisation")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random data")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("-w", "--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("-k", "--scenarios", default="", help="only run scenarios matching this regular expression")
+    parser.add_argument("-o", "--output", help="results file, by default in benchmarks/results")
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    client = app.test_client()
+    sha = commit()
+    results = {
+        "commit": sha,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "size": args.size,
+        "seed": args.seed,
+        "scenarios": {},
+    }
+
+    with app.app_context():
+        organisation_id = generate(SIZES[args.size], args.seed)
+        selected = [scenario for scenario in scenarios(organisation_id) if re.search(args.scenarios, scenario[0])]
+
+    print(f"{'scenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}")
+    for name, method, url, body in selected:
+        result = measure(client, method, url, body, args.requests, args.warmup)
+        results["scenarios"][name] = result
+        print(
+            f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            f"{result['throughput']:>10.1f}{result['queries']:>10.2f}"
+        )
+
+    output = args.output or os.path.join("benchmarks", "results", f"{args.size}-{(sha or 'unknown')[:7]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Micro-benchmark of encoding a list endpoint's response with each JSON serializer backend.
+
+Loads the list items of every person in a generated organisation, as the people list endpoint would with no limit, and
+times encoding them as a streamed JSON array with each installed backend in app.serializers.
+
+    python -m benchmarks.serialization --size 10k
+"""
+import argparse
+import timeit
+
+from app import serializers, streaming
+from app.models import Person, Role
+from sqlalchemy.orm import joinedload
+
+from benchmarks import create_benchmark_app
+from benchmarks.generate import SIZES, generate
+
+
+def encode(items):
+    for _ in streaming.json_array(items):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="10k", help="number of people in the organisation")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random data")
+    parser.add_argument("-n", "--number", type=int, default=5, help="encodings per timing run")
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    with app.app_context():
+        organisation_id = generate(SIZES[args.size], args.seed)
+        items = [
+            person.list_item()
+            for person in Person.query.filter_by(organisation_id=organisation_id).options(
+                joinedload(Person.role).joinedload(Role.grade),
+                joinedload(Person.role).joinedload(Role.practice),
+                joinedload(Person.location),
+            )
+        ]
+
+    default = streaming.dumps
+    try:
+        for name, (dumps, _) in serializers.backends.items():
+            streaming.dumps = dumps
+            best = min(timeit.repeat(lambda: encode(items), number=args.number, repeat=5))
+            print(f"{name:>8}: {best / args.number * 1000:8.1f} ms to encode {len(items)} list items")
+    finally:
+        streaming.dumps = default
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Micro-benchmark of per-request JSON Schema validation.
+
+Compares calling jsonschema.validate() with a new FormatChecker, as every POST/PUT handler used to, against the
+validators that app.schemas compiles once at startup.
+
+    python -m benchmarks.validation
+"""
+import argparse
+import timeit
+
+from jsonschema import FormatChecker
+from jsonschema import validate as jsonschema_validate
+
+from app.schemas import openapi, validate
+
+PERSON = {
+    "name": "Mickey Mouse",
+    "email_address": "mickey.mouse@example.com",
+    "role_id": "cbc0568d-86d2-4a59-82b2-affb05988628",
+    "employment": "permanent",
+    "full_time_equivalent": 1.0,
+    "location_id": "2d23f327-f308-4003-a9be-1ac7b9a8c01c",
+}
+
+
+def per_request():
+    jsonschema_validate(PERSON, openapi["components"]["schemas"]["PersonRequest"], format_checker=FormatChecker())
+
+
+def precompiled():
+    validate(PERSON, "PersonRequest")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=10000, help="validations per timing run")
+    args = parser.parse_args()
+
+    for name, func in (("per-request", per_request), ("precompiled", precompiled)):
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        print(f"{name:>12}: {best / args.number * 1e6:8.1f} us per validation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import glob
+import os
+import tempfile
+
+# Workers write their metrics to files in a shared directory. It has to be set before prometheus_client is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="flux-metrics-"))
+
+# Sync workers by default. With gevent, each worker serves up to worker_connections requests at once, switching between
+# them while they wait on Postgres or Redis.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+
+def on_starting(server):
+    # Metrics left over from a previous run would be counted again
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    if server.cfg.worker_class_str == "gevent":
+        # psycopg2 is a C extension that gevent can't patch, so make it yield to other requests while it waits
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,27 @@
+"""add version
+
+Revision ID: 04e3f22ad175
+Revises: 6bc5a69c1efc
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "04e3f22ad175"
+down_revision = "6bc5a69c1efc"
+branch_labels = None
+depends_on = None
+
+tables = ["grade", "location", "organisation", "person", "practice", "programme", "project", "role"]
+
+
+def upgrade():
+    for table in tables:
+        op.add_column(table, sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade():
+    for table in tables:
+        op.drop_column(table, "version")
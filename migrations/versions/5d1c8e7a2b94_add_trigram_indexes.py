@@ -0,0 +1,48 @@
+"""add trigram indexes
+
+Revision ID: 5d1c8e7a2b94
+Revises: 04e3f22ad175
+Create Date: 2026-10-17 10:24:09.581730
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d1c8e7a2b94"
+down_revision = "04e3f22ad175"
+branch_labels = None
+depends_on = None
+
+columns = [
+    ("grade", "name"),
+    ("location", "name"),
+    ("organisation", "name"),
+    ("person", "name"),
+    ("practice", "name"),
+    ("programme", "name"),
+    ("project", "name"),
+    ("role", "title"),
+]
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY can't run in a transaction, but doesn't lock the tables against writes while the indexes are built
+    with op.get_context().autocommit_block():
+        for table, column in columns:
+            op.create_index(
+                f"ix_{table}_{column}_trgm",
+                table,
+                [column],
+                unique=False,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    # The pg_trgm extension is left in place, as other objects in the database may depend on it
+    with op.get_context().autocommit_block():
+        for table, column in columns:
+            op.drop_index(f"ix_{table}_{column}_trgm", table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""add prefix search indexes
+
+Revision ID: 9e4b71f3c2d8
+Revises: 5d1c8e7a2b94
+Create Date: 2026-10-17 11:02:37.904115
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9e4b71f3c2d8"
+down_revision = "5d1c8e7a2b94"
+branch_labels = None
+depends_on = None
+
+columns = [
+    ("grade", "name"),
+    ("location", "name"),
+    ("person", "name"),
+    ("practice", "name"),
+    ("programme", "name"),
+    ("project", "name"),
+    ("role", "title"),
+]
+
+
+def upgrade():
+    # CONCURRENTLY can't run in a transaction, but doesn't lock the tables against writes while the indexes are built
+    with op.get_context().autocommit_block():
+        for table, column in columns:
+            op.create_index(
+                f"ix_{table}_organisation_id_lower_{column}",
+                table,
+                ["organisation_id", sa.text(f"lower({column}) text_pattern_ops")],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, column in columns:
+            op.drop_index(f"ix_{table}_organisation_id_lower_{column}", table_name=table, postgresql_concurrently=True)
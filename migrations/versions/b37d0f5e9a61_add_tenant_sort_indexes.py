@@ -0,0 +1,39 @@
+"""add tenant sort indexes
+
+Revision ID: b37d0f5e9a61
+Revises: 9e4b71f3c2d8
+Create Date: 2026-10-17 13:18:52.406217
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b37d0f5e9a61"
+down_revision = "9e4b71f3c2d8"
+branch_labels = None
+depends_on = None
+
+# Lists are filtered by organisation and ordered by name or title then id, so these serve both without a sort
+indexes = [
+    ("ix_grade_organisation_id_name_id", "grade", ["organisation_id", "name", "id"]),
+    ("ix_location_organisation_id_name_id", "location", ["organisation_id", "name", "id"]),
+    ("ix_person_organisation_id_name_id", "person", ["organisation_id", "name", "id"]),
+    ("ix_practice_organisation_id_name_id", "practice", ["organisation_id", "name", "id"]),
+    ("ix_programme_organisation_id_name_id", "programme", ["organisation_id", "name", "id"]),
+    ("ix_project_organisation_id_name_id", "project", ["organisation_id", "name", "id"]),
+    ("ix_project_organisation_id_status_name_id", "project", ["organisation_id", "status", "name", "id"]),
+    ("ix_role_organisation_id_title_id", "role", ["organisation_id", "title", "id"]),
+]
+
+
+def upgrade():
+    # CONCURRENTLY can't run in a transaction, but doesn't lock the tables against writes while the indexes are built
+    with op.get_context().autocommit_block():
+        for name, table, columns in indexes:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in indexes:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,54 @@
+JSON = {"Accept": "application/json"}
+
+
+def test_batch_create(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/locations"
+    items = [{"name": "Leeds", "address": "1 Park Row"}, {"name": "York", "address": "2 Stonegate"}]
+
+    response = client.post(f"{url}:batch", json=items, headers=JSON)
+
+    assert response.status_code == 201
+    assert response.json["count"] == 2
+    assert len(client.get(url, headers=JSON).json) == len(organisation.locations) + 2
+
+
+def test_batch_create_reports_every_invalid_item(client, organisation):
+    lines = ['{"name": "Leeds", "address": "1 Park Row"}', "{not json", "", '{"name": "York"}']
+
+    response = client.post(
+        f"/v1/organisations/{organisation.id}/locations:batch",
+        data="\n".join(lines),
+        headers={**JSON, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 400
+    assert [error["index"] for error in response.json["errors"]] == [1, 2]
+    assert response.json["errors"][0]["description"] == "Invalid JSON."
+
+
+def test_batch_create_needs_an_array(client, organisation):
+    response = client.post(f"/v1/organisations/{organisation.id}/locations:batch", json={"name": "Leeds"}, headers=JSON)
+
+    assert response.status_code == 400
+
+
+def test_list_by_ids(client, organisation):
+    ids = [organisation.people[1], organisation.roles[0], organisation.people[0]]
+
+    response = client.get(
+        f"/v1/organisations/{organisation.id}/people", query_string={"ids": ",".join(ids)}, headers=JSON
+    )
+
+    assert response.status_code == 200
+    assert [person["id"] for person in response.json["data"]] == [organisation.people[1], organisation.people[0]]
+    assert response.json["missing"] == [organisation.roles[0]]
+
+
+def test_list_by_ids_is_not_acceptable_as_csv(client, organisation):
+    response = client.get(
+        f"/v1/organisations/{organisation.id}/people",
+        query_string={"ids": organisation.people[0]},
+        headers={"Accept": "text/csv"},
+    )
+
+    assert response.status_code == 406
@@ -0,0 +1,103 @@
+import pytest
+from app.cache import LRUStore, cache
+
+JSON = {"Accept": "application/json"}
+
+
+@pytest.fixture
+def response_cache(app, monkeypatch):
+    """The response cache, enabled with an in-process store for the length of a test."""
+    monkeypatch.setattr(cache, "store", cache.store)
+    monkeypatch.setitem(app.config, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setitem(app.config, "RESPONSE_CACHE_STORAGE_URL", None)
+    cache.init_app(app)
+
+    return cache
+
+
+def test_responses_are_served_from_the_cache(client, organisation, response_cache, query_budget):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}"
+    response = client.get(url, headers=JSON)
+    assert response.headers["X-Cache"] == "MISS"
+
+    with query_budget(0):
+        cached = client.get(url, headers=JSON)
+
+    assert cached.headers["X-Cache"] == "HIT"
+    assert cached.json == response.json
+    assert cached.headers["ETag"] == response.headers["ETag"]
+
+
+def test_writes_invalidate_the_responses_that_embed_them(client, organisation, response_cache):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}"
+    role = client.get(url, headers=JSON).json["role"]
+
+    client.put(
+        f"/v1/organisations/{organisation.id}/roles/{role['id']}",
+        json={"title": "Renamed", "grade_id": role["grade"]["id"], "practice_id": role["practice"]["id"]},
+        headers=JSON,
+    )
+
+    response = client.get(url, headers=JSON)
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["role"]["title"] == "Renamed"
+
+
+def test_writes_leave_unrelated_responses_cached(client, organisation, response_cache):
+    url = f"/v1/organisations/{organisation.id}/grades"
+    client.get(url, headers=JSON)
+
+    client.post(f"/v1/organisations/{organisation.id}/locations", json={"name": "Leeds", "address": "1 Park Row"})
+    assert client.get(url, headers=JSON).headers["X-Cache"] == "HIT"
+
+    client.post(url, json={"name": "New grade"}, headers=JSON)
+    assert client.get(url, headers=JSON).headers["X-Cache"] == "MISS"
+
+
+def test_cached_responses_answer_if_none_match(client, organisation, response_cache):
+    url = f"/v1/organisations/{organisation.id}/grades/{organisation.grades[0]}"
+    etag = client.get(url, headers=JSON).headers["ETag"]
+
+    response = client.get(url, headers={**JSON, "If-None-Match": etag})
+
+    assert (response.status_code, response.headers["X-Cache"]) == (304, "HIT")
+
+
+def test_cached_responses_answer_if_modified_since(client, organisation, response_cache):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}"
+    last_modified = client.get(url, headers=JSON).headers["Last-Modified"]
+
+    response = client.get(url, headers={**JSON, "If-Modified-Since": last_modified})
+    assert (response.status_code, response.headers["X-Cache"]) == (304, "HIT")
+
+    response = client.get(url, headers={**JSON, "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert (response.status_code, response.headers["X-Cache"]) == (200, "HIT")
+
+
+def test_lru_store_evicts_the_least_recently_used_entry():
+    store = LRUStore(2)
+    store.set("a", "1", 60)
+    store.set("b", "2", 60)
+    store.get("a")
+
+    store.set("c", "3", 60)
+
+    assert [store.get(key) for key in ("a", "b", "c")] == ["1", None, "3"]
+
+
+def test_lru_store_expires_entries():
+    store = LRUStore(2)
+    store.set("a", "1", -1)
+
+    assert store.get("a") is None
+
+
+def test_lru_store_generations_change_when_invalidated():
+    store = LRUStore(2)
+    before = store.generations(["org:people", "org:roles"])
+    assert store.generations(["org:people", "org:roles"]) == before
+
+    store.invalidate(["org:roles"])
+
+    after = store.generations(["org:people", "org:roles"])
+    assert after[0] == before[0] and after[1] != before[1]
@@ -0,0 +1,74 @@
+JSON = {"Accept": "application/json"}
+
+
+def test_unchanged_resource_is_not_modified(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}"
+    etag = client.get(url, headers=JSON).headers["ETag"]
+
+    response = client.get(url, headers={**JSON, "If-None-Match": etag})
+
+    assert response.status_code == 304
+
+
+def test_renaming_an_embedded_row_changes_the_etag(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}"
+    response = client.get(url, headers=JSON)
+    etag, role = response.headers["ETag"], response.json["role"]
+
+    client.put(
+        f"/v1/organisations/{organisation.id}/roles/{role['id']}",
+        json={"title": "Renamed", "grade_id": role["grade"]["id"], "practice_id": role["practice"]["id"]},
+        headers=JSON,
+    )
+
+    assert client.get(url, headers={**JSON, "If-None-Match": etag}).json["role"]["title"] == "Renamed"
+
+
+def test_etag_only_covers_requested_fields(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/people/{organisation.people[1]}?fields=id,name"
+    etag = client.get(url, headers=JSON).headers["ETag"]
+    role = client.get(f"/v1/organisations/{organisation.id}/roles/{organisation.roles[1]}", headers=JSON).json
+
+    client.put(
+        f"/v1/organisations/{organisation.id}/roles/{role['id']}",
+        json={"title": "Renamed", "grade_id": role["grade"]["id"]},
+        headers=JSON,
+    )
+
+    assert client.get(url, headers={**JSON, "If-None-Match": etag}).status_code == 304
+
+
+def test_counts_change_the_etag(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+    response = client.get(url, headers=JSON)
+    assert "Last-Modified" not in response.headers
+
+    client.post(f"{url}/grades", json={"name": "New grade"}, headers=JSON)
+
+    response = client.get(url, headers={**JSON, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json["grades"] == len(organisation.grades) + 1
+
+
+def test_if_match_compares_the_rows_own_version(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/grades/{organisation.grades[0]}"
+    etag = client.get(url, headers=JSON).headers["ETag"]
+
+    response = client.put(url, json={"name": "Renamed"}, headers={**JSON, "If-Match": etag})
+    assert response.status_code == 200
+    assert client.get(url, headers={**JSON, "If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    response = client.put(url, json={"name": "Renamed again"}, headers={**JSON, "If-Match": etag})
+    assert response.status_code == 412
+
+
+def test_if_match_only_matches_strong_tags(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/grades/{organisation.grades[0]}"
+    etag = client.get(url, headers=JSON).headers["ETag"]
+    assert not etag.startswith("W/")
+
+    response = client.put(url, json={"name": "Renamed"}, headers={**JSON, "If-Match": f"W/{etag}"})
+    assert response.status_code == 412
+
+    response = client.put(url, json={"name": "Renamed"}, headers={**JSON, "If-Match": f'{etag[:-1]}:gzip"'})
+    assert response.status_code == 200
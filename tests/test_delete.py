@@ -0,0 +1,60 @@
+JSON = {"Accept": "application/json"}
+
+
+def test_deleting_a_practice_keeps_its_roles(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+
+    assert client.delete(f"{url}/practices/{organisation.practices[0]}", headers=JSON).status_code == 204
+
+    role = client.get(f"{url}/roles/{organisation.roles[0]}", headers=JSON).json
+    assert role["practice"] is None
+    assert len(client.get(f"{url}/people", headers=JSON).json) == len(organisation.people)
+
+
+def test_deleting_a_programme_keeps_its_projects(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+    project = client.get(f"{url}/projects/{organisation.projects[0]}", headers=JSON)
+
+    assert client.delete(f"{url}/programmes/{organisation.programmes[0]}", headers=JSON).status_code == 204
+
+    response = client.get(f"{url}/projects/{organisation.projects[0]}", headers=JSON)
+    assert response.json["programme"] is None
+    assert response.headers["ETag"] != project.headers["ETag"]
+
+
+def test_deleting_a_person_keeps_what_they_head_or_manage(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+
+    assert client.delete(f"{url}/people/{organisation.people[0]}", headers=JSON).status_code == 204
+
+    assert client.get(f"{url}/practices/{organisation.practices[0]}", headers=JSON).json["head"] is None
+    assert client.get(f"{url}/programmes/{organisation.programmes[0]}", headers=JSON).json["manager"] is None
+    assert client.get(f"{url}/projects/{organisation.projects[0]}", headers=JSON).json["manager"] is None
+
+
+def test_roles_and_grades_in_use_cant_be_deleted(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+
+    assert client.delete(f"{url}/roles/{organisation.roles[0]}", headers=JSON).status_code == 409
+    assert client.delete(f"{url}/grades/{organisation.grades[0]}", headers=JSON).status_code == 409
+    assert client.delete(url, headers=JSON).status_code == 409
+
+    assert len(client.get(f"{url}/people", headers=JSON).json) == len(organisation.people)
+    assert len(client.get(f"{url}/roles", headers=JSON).json) == len(organisation.roles)
+
+
+def test_unused_role_can_be_deleted(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+    role = client.post(f"{url}/roles", json={"title": "Unused", "grade_id": organisation.grades[0]}, headers=JSON)
+
+    assert client.delete(f"{url}/roles/{role.json['id']}", headers=JSON).status_code == 204
+    assert client.get(f"{url}/roles/{role.json['id']}", headers=JSON).status_code == 404
+
+
+def test_failed_precondition_changes_nothing(client, organisation):
+    url = f"/v1/organisations/{organisation.id}"
+
+    response = client.delete(f"{url}/practices/{organisation.practices[0]}", headers={**JSON, "If-Match": '"99"'})
+
+    assert response.status_code == 412
+    assert client.get(f"{url}/roles/{organisation.roles[0]}", headers=JSON).json["practice"] is not None
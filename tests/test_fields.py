@@ -0,0 +1,38 @@
+import pytest
+from app.fields import FIELDS
+
+JSON = {"Accept": "application/json"}
+
+RESOURCES = [
+    ("grades", "Grade"),
+    ("locations", "Location"),
+    ("people", "Person"),
+    ("practices", "Practice"),
+    ("programmes", "Programme"),
+    ("projects", "Project"),
+    ("roles", "Role"),
+]
+
+
+@pytest.mark.parametrize("collection, representation", RESOURCES)
+def test_fields_are_the_keys_of_the_representations(client, organisation, collection, representation):
+    url = f"/v1/organisations/{organisation.id}/{collection}"
+    items = client.get(url, headers=JSON).json
+    resource = client.get(f"{url}/{getattr(organisation, collection)[0]}", headers=JSON).json
+
+    assert all(set(item) == set(FIELDS[f"{representation}Item"]) for item in items)
+    assert set(resource) == set(FIELDS[representation])
+
+
+def test_organisation_fields_are_the_keys_of_its_representations(client, organisation):
+    assert set(client.get(f"/v1/organisations/{organisation.id}", headers=JSON).json) == set(FIELDS["Organisation"])
+    assert set(client.get("/v1/organisations", headers=JSON).json[0]) == set(FIELDS["OrganisationItem"])
+
+
+@pytest.mark.parametrize("path", ["people", "people/{person}"])
+def test_fields_that_are_not_output_are_bad_requests(client, organisation, path):
+    url = f"/v1/organisations/{organisation.id}/{path.format(person=organisation.people[0])}"
+
+    response = client.get(url, query_string={"fields": "name,teams"}, headers=JSON)
+
+    assert response.status_code == 400
@@ -0,0 +1,52 @@
+import pytest
+from app import db as _db
+
+JSON = {"Accept": "application/json"}
+
+
+@pytest.fixture
+def trigrams(app):
+    """Skip a test unless the migrations could install the pg_trgm extension in the test database."""
+    with app.app_context():
+        installed = _db.session.execute("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'").scalar()
+    if not installed:
+        pytest.skip("pg_trgm isn't installed in the test database.")
+
+
+@pytest.mark.parametrize(
+    "name, matches",
+    [("100%", ["100% Done"]), ("A_B", ["A_B"]), ("C\\D", ["C\\D"]), ("100", ["100 Percent", "100% Done"])],
+)
+def test_names_are_matched_literally(client, organisation, name, matches):
+    url = f"/v1/organisations/{organisation.id}/locations"
+    for location in ("100% Done", "100 Percent", "A_B", "Axb", "C\\D", "Cd"):
+        client.post(url, json={"name": location, "address": "1 Park Row"}, headers=JSON)
+
+    response = client.get(url, query_string={"name": name}, headers=JSON)
+
+    assert [location["name"] for location in response.json] == matches
+
+
+def test_relevance_pages_follow_next_links(client, organisation, trigrams):
+    url = f"/v1/organisations/{organisation.id}/people"
+    query_string = {"name": "Person 0", "sort": "relevance"}
+    everyone = [person["name"] for person in client.get(url, query_string=query_string, headers=JSON).json]
+
+    names = []
+    response = client.get(url, query_string={**query_string, "limit": 3}, headers=JSON)
+    while True:
+        names += [person["name"] for person in response.json]
+        link = response.headers.get("Link")
+        if not link:
+            break
+        response = client.get(link.split(";")[0].strip("<>"), headers=JSON)
+
+    assert len(everyone) == 10
+    assert names == everyone
+
+
+@pytest.mark.parametrize("query_string", [{"sort": "relevance"}, {"name": "Person", "sort": "name"}])
+def test_invalid_sorts_are_bad_requests(client, organisation, query_string):
+    response = client.get(f"/v1/organisations/{organisation.id}/people", query_string=query_string, headers=JSON)
+
+    assert response.status_code == 400
@@ -0,0 +1,54 @@
+JSON = {"Accept": "application/json"}
+HEADER = "NAME,EMAIL_ADDRESS,FULL_TIME_EQUIVALENT,EMPLOYMENT,ROLE_ID,LOCATION_ID"
+
+
+def upload(client, organisation, *rows):
+    return client.post(
+        f"/v1/organisations/{organisation.id}/people",
+        data="\n".join((HEADER, *rows)),
+        headers={**JSON, "Content-Type": "text/csv"},
+    )
+
+
+def test_import_inserts_and_updates_by_email_address(client, organisation):
+    role, location = organisation.roles[0], organisation.locations[0]
+
+    response = upload(
+        client,
+        organisation,
+        f"New Person,new.person@acme.com,1.0,permanent,{role},{location}",
+        f"Renamed Person,person.0@acme.com,0.5,permanent,{role},{location}",
+    )
+
+    assert response.status_code == 200
+    assert response.json == {"inserted": 1, "updated": 1, "skipped": 0}
+    person = client.get(f"/v1/organisations/{organisation.id}/people/{organisation.people[0]}", headers=JSON).json
+    assert (person["name"], person["full_time_equivalent"]) == ("Renamed Person", 0.5)
+
+
+def test_import_reports_every_invalid_row(client, organisation):
+    role, location = organisation.roles[0], organisation.locations[0]
+
+    response = upload(
+        client,
+        organisation,
+        f"First,first@acme.com,lots,permanent,{role},{location}",
+        f"Second,second@acme.com,1.0,permanent,{role},{location}",
+        f"Third,second@acme.com,1.0,permanent,{role},{location}",
+        f"Fourth,fourth@acme.com,1.0,permanent,not-a-uuid,{location}",
+    )
+
+    assert response.status_code == 400
+    assert [error["index"] for error in response.json["errors"]] == [0, 2, 3]
+    assert len(client.get(f"/v1/organisations/{organisation.id}/people", headers=JSON).json) == len(organisation.people)
+
+
+def test_import_needs_every_column(client, organisation):
+    response = client.post(
+        f"/v1/organisations/{organisation.id}/people",
+        data="NAME,EMAIL_ADDRESS\nSomeone,someone@acme.com",
+        headers={**JSON, "Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 400
+    assert "FULL_TIME_EQUIVALENT" in response.json["description"]
@@ -0,0 +1,21 @@
+import logging
+
+from app.instrumentation import instrumentation
+
+
+def test_slow_query_plans_leave_out_parameters(app, organisation, caplog):
+    statement = (
+        "SELECT person.id FROM person JOIN role ON role.id = person.role_id "
+        "WHERE person.organisation_id = %(organisation_id)s AND person.name ILIKE %(name)s ORDER BY person.name"
+    )
+    parameters = {"organisation_id": organisation.id, "name": "%Person 0%"}
+
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        instrumentation.explain(app, "person.list", [(statement, parameters, 1000.0)])
+
+    [record] = [record for record in caplog.records if record.getMessage().startswith("Plan of slow query")]
+    assert "on person" in record.plan
+    assert "Execution Time" in record.plan
+    assert organisation.id not in record.getMessage()
+    assert "Person 0" not in record.getMessage()
+    assert record.parameters == ["name", "organisation_id"]
@@ -0,0 +1,45 @@
+from app import db
+from prometheus_client import REGISTRY
+
+CSV = {"Accept": "text/csv"}
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_streamed_response_sizes_are_counted_in_bytes(app, client, organisation, monkeypatch):
+    monkeypatch.setitem(app.config, "CSV_EXPORT_COPY", False)
+    with app.app_context():
+        db.session.execute("UPDATE person SET name = 'Zoë Ångström' WHERE name = 'Person 00'")
+        db.session.commit()
+    labels = {"method": "GET", "endpoint": "person.list"}
+    before = sample("flux_response_size_bytes_sum", **labels), sample("flux_response_size_bytes_count", **labels)
+
+    response = client.get(f"/v1/organisations/{organisation.id}/people", headers=CSV)
+    body = response.get_data()
+    response.close()
+
+    assert "Zoë Ångström" in body.decode()
+    assert sample("flux_response_size_bytes_sum", **labels) - before[0] == len(body)
+    assert sample("flux_response_size_bytes_count", **labels) - before[1] == 1
+
+
+def test_requests_are_timed_by_endpoint_and_status(client, organisation):
+    labels = {"method": "GET", "endpoint": "grade.get", "status": "404"}
+    before = sample("flux_request_duration_seconds_count", **labels)
+
+    client.get(
+        f"/v1/organisations/{organisation.id}/grades/{organisation.people[0]}", headers={"Accept": "application/json"}
+    )
+
+    assert sample("flux_request_duration_seconds_count", **labels) - before == 1
+
+
+def test_metrics_are_served_for_prometheus(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"# TYPE flux_request_duration_seconds histogram" in response.data
+    assert b"flux_db_pool_size" in response.data
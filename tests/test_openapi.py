@@ -0,0 +1,98 @@
+import gzip
+import json
+import uuid
+
+import brotli
+import pytest
+from app.schemas import openapi
+from jsonschema import Draft7Validator
+
+JSON = {"Accept": "application/json"}
+
+
+def errors(path, method, instance):
+    """The ways an instance doesn't have the documented shape of an operation's successful response.
+
+    Resources are only checked to be objects with ids, or null where they're related, which their schemas can't say.
+    """
+    responses = openapi["paths"][path][method]["responses"]
+    [response] = [responses[status] for status in ("200", "201") if status in responses]
+    schema = response["content"]["application/json"]["schema"]
+    schemas = {
+        name: schema if name == "Included" else {"oneOf": [{"type": "null"}, {"type": "object", "required": ["id"]}]}
+        for name, schema in openapi["components"]["schemas"].items()
+    }
+
+    return [
+        error.message for error in Draft7Validator({**schema, "components": {"schemas": schemas}}).iter_errors(instance)
+    ]
+
+
+@pytest.mark.parametrize(
+    "collection, query_string",
+    [
+        ("roles", {}),
+        ("roles", {"include": "grade,practice.head"}),
+        ("programmes", {"include": "manager"}),
+        ("practices", {"fields": "id", "include": "head"}),
+    ],
+)
+def test_lists_match_the_specification(client, organisation, collection, query_string):
+    response = client.get(f"/v1/organisations/{organisation.id}/{collection}", query_string=query_string, headers=JSON)
+
+    assert errors(f"/organisations/{{organisation_id}}/{collection}", "get", response.json) == []
+
+
+@pytest.mark.parametrize("query_string", [{}, {"include": "grade,practice.head"}])
+def test_roles_match_the_specification(client, organisation, query_string):
+    url = f"/v1/organisations/{organisation.id}/roles/{organisation.roles[0]}"
+    response = client.get(url, query_string=query_string, headers=JSON)
+
+    assert errors("/organisations/{organisation_id}/roles/{role_id}", "get", response.json) == []
+
+
+@pytest.mark.parametrize("collection, include", [("grades", None), ("roles", None), ("roles", "grade,practice.head")])
+def test_batches_match_the_specification(client, organisation, collection, include):
+    ids = [*getattr(organisation, collection)[:2], str(uuid.uuid4())]
+    query_string = {"ids": ",".join(ids)} if include is None else {"ids": ",".join(ids), "include": include}
+    listed = client.get(f"/v1/organisations/{organisation.id}/{collection}", query_string=query_string, headers=JSON)
+    query_string.pop("ids")
+    got = client.post(
+        f"/v1/organisations/{organisation.id}/{collection}:batchGet",
+        query_string=query_string,
+        json={"ids": ids},
+        headers=JSON,
+    )
+
+    assert listed.json["missing"] == got.json["missing"] == ids[2:]
+    assert errors(f"/organisations/{{organisation_id}}/{collection}", "get", listed.json) == []
+    assert errors(f"/organisations/{{organisation_id}}/{collection}:batchGet", "post", got.json) == []
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress",
+    [("br", brotli.decompress), ("gzip", gzip.decompress), ("identity", lambda body: body)],
+)
+def test_specification_is_sent_in_each_encoding(client, encoding, decompress):
+    response = client.get("/openapi", headers={"Accept-Encoding": encoding})
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == (None if encoding == "identity" else encoding)
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.mimetype == "application/json"
+    assert json.loads(decompress(response.get_data())) == openapi
+
+
+@pytest.mark.parametrize("held, encoding", [("br", "gzip"), ("gzip", "identity"), ("identity", "br")])
+def test_specification_held_in_another_encoding_is_current(app, client, held, encoding):
+    etag = client.get("/openapi", headers={"Accept-Encoding": held}).headers["ETag"]
+
+    # Werkzeug drops a 304's Content-Type when it's sent, so the response is checked as the app made it
+    with app.test_request_context("/openapi", headers={"Accept-Encoding": encoding, "If-None-Match": etag}):
+        response = app.full_dispatch_request()
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.mimetype == "application/json"
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,53 @@
+import base64
+import json
+
+import pytest
+
+JSON = {"Accept": "application/json"}
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_pages_follow_next_links(client, organisation):
+    url = f"/v1/organisations/{organisation.id}/people?limit=5"
+    names = []
+    while url:
+        response = client.get(url, headers=JSON)
+        names += [person["name"] for person in response.json]
+        link = response.headers.get("Link")
+        url = link.split(";")[0].strip("<>") if link else None
+
+    assert names == sorted(f"Person {i:02}" for i in range(12))
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "not base64!",
+        cursor({"name": "Person 01"}),
+        cursor(["Person 01"]),
+        cursor([1, 2]),
+        cursor(["Person 01", "nope"]),
+        cursor(["Person 01", None]),
+        cursor([["Person 01"], "0b4ebc2c-7d8c-4a8e-a0f4-24f1a6a6f2e6"]),
+        cursor(["Person \x00", "0b4ebc2c-7d8c-4a8e-a0f4-24f1a6a6f2e6"]),
+    ],
+)
+def test_invalid_cursors_are_bad_requests(client, organisation, value):
+    response = client.get(f"/v1/organisations/{organisation.id}/people", query_string={"cursor": value}, headers=JSON)
+
+    assert response.status_code == 400
+    assert response.json["description"] == "Invalid cursor."
+
+
+def test_next_link_keeps_the_path_when_a_query_parameter_shares_its_name(client, organisation):
+    response = client.get(
+        f"/v1/organisations/{organisation.id}/people",
+        query_string={"organisation_id": "x", "limit": 2},
+        headers=JSON,
+    )
+
+    assert len(response.json) == 2
+    assert response.headers["Link"].startswith(f"<http://localhost/v1/organisations/{organisation.id}/people?")
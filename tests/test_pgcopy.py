@@ -0,0 +1,86 @@
+import csv
+import io
+
+import psycopg2.extensions
+import psycopg2.extras
+import pytest
+from app import db
+
+CSV = {"Accept": "text/csv"}
+
+
+@pytest.fixture
+def wait_callback():
+    """A wait callback installed in psycopg2, as psycogreen installs one for gevent workers."""
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+    yield psycopg2.extras.wait_select
+    psycopg2.extensions.set_wait_callback(None)
+
+
+def test_export_with_copy(client, organisation):
+    response = client.get(f"/v1/organisations/{organisation.id}/people", headers=CSV)
+
+    assert response.status_code == 200
+    assert len(list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))) == len(organisation.people)
+
+
+@pytest.mark.parametrize(
+    "collection", ["grades", "locations", "organisations", "people", "practices", "programmes", "projects", "roles"]
+)
+def test_exports_with_and_without_copy_are_the_same(app, client, organisation, monkeypatch, collection):
+    with app.app_context():
+        # Whole and fractional numbers, and timestamps with and without microseconds
+        db.session.execute("UPDATE person SET full_time_equivalent = 1 WHERE name < 'Person 04'")
+        db.session.execute("UPDATE person SET full_time_equivalent = 0.5 WHERE name >= 'Person 08'")
+        for table in ("organisation", "grade", "location", "person", "practice", "programme", "project", "role"):
+            db.session.execute(f"UPDATE {table} SET created_at = date_trunc('second', created_at), updated_at = now()")
+        db.session.commit()
+    url = "/v1/organisations" if collection == "organisations" else f"/v1/organisations/{organisation.id}/{collection}"
+
+    copied = client.get(url, headers=CSV).get_data()
+    monkeypatch.setitem(app.config, "CSV_EXPORT_COPY", False)
+    written = client.get(url, headers=CSV).get_data()
+
+    assert copied == written
+
+
+@pytest.mark.parametrize(
+    "collection", ["grades", "locations", "people", "practices", "programmes", "projects", "roles"]
+)
+def test_export_without_copy(app, client, organisation, monkeypatch, collection):
+    monkeypatch.setitem(app.config, "CSV_EXPORT_COPY", False)
+
+    response = client.get(f"/v1/organisations/{organisation.id}/{collection}", headers=CSV)
+
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert sorted(row["ID"] for row in rows) == sorted(getattr(organisation, collection))
+
+
+def test_export_without_copy_keeps_the_wait_callback(client, organisation, wait_callback):
+    response = client.get(f"/v1/organisations/{organisation.id}/people", headers=CSV)
+
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert sorted(row["NAME"] for row in rows) == [f"Person {i:02}" for i in range(12)]
+    assert psycopg2.extensions.get_wait_callback() is wait_callback
+
+
+def test_import_without_copy_keeps_the_wait_callback(client, organisation, wait_callback):
+    role, location = organisation.roles[0], organisation.locations[0]
+
+    response = client.post(
+        f"/v1/organisations/{organisation.id}/people",
+        data="\n".join(
+            (
+                "NAME,EMAIL_ADDRESS,FULL_TIME_EQUIVALENT,EMPLOYMENT,ROLE_ID,LOCATION_ID",
+                f"New Person,new.person@acme.com,1.0,permanent,{role},{location}",
+                f"Renamed Person,person.0@acme.com,0.5,permanent,{role},{location}",
+            )
+        ),
+        headers={"Accept": "application/json", "Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    assert response.json == {"inserted": 1, "updated": 1, "skipped": 0}
+    assert psycopg2.extensions.get_wait_callback() is wait_callback
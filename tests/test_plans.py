@@ -0,0 +1,86 @@
+"""Check that the list endpoints read their pages from indexes, without sorting the organisation's rows.
+
+The SQL statements each list request runs are EXPLAINed with sequential scans disabled, so that the check holds however
+few rows the tables have. A page must come from an index scan of the listed table, with no sort between it and the
+LIMIT unless there is less than a page of rows.
+"""
+import pytest
+from app import db
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Pages smaller than the organisation, so that sorting its rows for a page would show in the plans
+LIMIT = 2
+
+
+def scans(plan, table, sorted=False):
+    """Find the scans of a table in a query plan, and whether their rows are sorted before reaching a LIMIT."""
+    if plan["Node Type"] == "Limit":
+        sorted = False
+    elif plan["Node Type"] in ("Sort", "Incremental Sort"):
+        sorted = True
+
+    if plan.get("Relation Name") == table:
+        yield plan["Node Type"], sorted, plan["Plan Rows"]
+    for child in plan.get("Plans", []):
+        yield from scans(child, table, sorted)
+
+
+def explain(statement, parameters):
+    """EXPLAIN a statement with sequential and bitmap scans disabled."""
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_bitmapscan = off")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@pytest.mark.parametrize(
+    "collection, filters, table",
+    [
+        ("grades", {}, "grade"),
+        ("locations", {}, "location"),
+        ("people", {}, "person"),
+        ("practices", {}, "practice"),
+        ("programmes", {}, "programme"),
+        ("projects", {}, "project"),
+        ("projects", {"status": "active"}, "project"),
+        ("roles", {}, "role"),
+    ],
+)
+def test_list_pages_are_index_scans(app, client, organisation, collection, filters, table):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(
+            f"/v1/organisations/{organisation.id}/{collection}",
+            query_string={"limit": LIMIT, **filters},
+            headers={"Accept": "application/json"},
+        )
+        response.get_data()
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+
+    pages = [(statement, parameters) for statement, parameters in statements if "LIMIT" in statement]
+    assert any(f"FROM {table}" in statement for statement, _ in pages)
+
+    with app.app_context():
+        # Statistics, so that the planner knows there is more than a page of rows
+        db.session.execute(f"ANALYZE {table}")
+        db.session.commit()
+
+        for statement, parameters in pages:
+            if f"FROM {table}" not in statement:
+                continue
+            for node_type, sorted, rows in scans(explain(statement, parameters), table):
+                assert node_type in ("Index Scan", "Index Only Scan"), f"{node_type} on {table}"
+                assert not sorted or rows <= LIMIT, f"{rows} {table} rows sorted after an {node_type}"
@@ -0,0 +1,76 @@
+import pytest
+
+JSON = {"Accept": "application/json"}
+
+
+@pytest.mark.parametrize(
+    "path, budget",
+    [
+        ("grades", 2),
+        ("locations", 2),
+        ("people", 2),
+        ("practices", 2),
+        ("programmes", 2),
+        ("projects", 2),
+        ("projects?status=active", 2),
+        ("roles", 2),
+        ("people?fields=id,name", 2),
+        ("people?include=role,location", 4),
+        ("practices?include=head", 3),
+        ("programmes?include=manager", 3),
+        ("projects?include=manager,programme.manager", 4),
+        ("roles?include=grade,practice", 4),
+    ],
+)
+def test_list_queries_dont_grow_with_items(client, organisation, query_budget, path, budget):
+    with query_budget(budget):
+        response = client.get(f"/v1/organisations/{organisation.id}/{path}", headers=JSON)
+        items = response.json
+
+    assert response.status_code == 200
+    assert len(items["data"] if "data" in items else items) > 1
+
+
+@pytest.mark.parametrize(
+    "collection, budget",
+    [
+        ("grades", 3),
+        ("locations", 3),
+        ("people", 7),
+        ("practices", 4),
+        ("programmes", 4),
+        ("projects", 5),
+        ("roles", 6),
+    ],
+)
+def test_get_queries(client, organisation, query_budget, collection, budget):
+    id = getattr(organisation, collection)[0]
+
+    with query_budget(budget):
+        response = client.get(f"/v1/organisations/{organisation.id}/{collection}/{id}", headers=JSON)
+        response.get_data()
+
+    assert response.status_code == 200
+
+
+def test_get_with_fields_skips_relationships(client, organisation, query_budget):
+    with query_budget(2):
+        response = client.get(
+            f"/v1/organisations/{organisation.id}/people/{organisation.people[0]}?fields=id,name", headers=JSON
+        )
+
+    assert response.json == {"id": organisation.people[0], "name": "Person 00"}
+
+
+def test_batch_get_is_one_query(client, organisation, query_budget):
+    ids = organisation.people[::-1]
+
+    with query_budget(1):
+        response = client.post(
+            f"/v1/organisations/{organisation.id}/people:batchGet",
+            json={"ids": ids},
+            headers=JSON,
+        )
+
+    assert [person["id"] for person in response.json["data"]] == ids
+    assert response.json["missing"] == []
@@ -0,0 +1,55 @@
+import pytest
+from app.search import routes
+from sqlalchemy import func
+
+JSON = {"Accept": "application/json"}
+
+
+def test_search_shows_matches_as_list_items(client, organisation, query_budget):
+    url = f"/v1/organisations/{organisation.id}"
+
+    with query_budget(2):
+        response = client.get(f"{url}/search", query_string={"q": "person 1", "limit": 3}, headers=JSON)
+
+    assert response.status_code == 200
+    assert [*response.json] == [*routes.TYPES]
+    people = {person["id"]: person for person in client.get(f"{url}/people", headers=JSON).json}
+    assert response.json["people"] == [people[id] for id in organisation.people[10:12]]
+
+
+def test_search_limits_each_type(client, organisation):
+    response = client.get(
+        f"/v1/organisations/{organisation.id}/search",
+        query_string={"q": "Person", "types": "people,roles", "limit": 3},
+        headers=JSON,
+    )
+
+    assert response.status_code == 200
+    assert [person["name"] for person in response.json["people"]] == ["Person 00", "Person 01", "Person 02"]
+    assert [*response.json] == ["people", "roles"]
+
+
+def test_search_escapes_wildcards(client, organisation):
+    response = client.get(f"/v1/organisations/{organisation.id}/search", query_string={"q": "Person_0"}, headers=JSON)
+
+    assert response.json["people"] == []
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [{}, {"q": " "}, {"q": "a", "types": "people,teams"}, {"q": "a", "limit": 0}, {"q": "a", "limit": 21}],
+)
+def test_invalid_searches_are_bad_requests(client, organisation, query_string):
+    response = client.get(f"/v1/organisations/{organisation.id}/search", query_string=query_string, headers=JSON)
+
+    assert response.status_code == 400
+
+
+def test_slow_searches_are_unavailable(app, client, organisation, monkeypatch):
+    monkeypatch.setitem(app.config, "SEARCH_TIMEOUT", 10)
+    matches = routes.matches
+    monkeypatch.setattr(routes, "matches", lambda *args: matches(*args).where(func.pg_sleep(0.1).isnot(None)))
+
+    response = client.get(f"/v1/organisations/{organisation.id}/search", query_string={"q": "Person"}, headers=JSON)
+
+    assert response.status_code == 503
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from app import serializers
+
+
+@pytest.mark.skipif(serializers.orjson is None, reason="orjson isn't installed.")
+def test_backends_encode_the_same_bytes():
+    document = {
+        "id": uuid.UUID("0b4ebc2c-7d8c-4a8e-a0f4-24f1a6a6f2e6"),
+        "name": "Zoë Ångström",
+        "created_at": datetime(2021, 6, 1, 9, 30, 15, 123456, tzinfo=timezone.utc),
+        "updated_at": datetime(2021, 6, 1, 9, 30, 15, tzinfo=timezone.utc),
+        "started_on": date(2021, 6, 1),
+        "full_time_equivalent": 0.5,
+        "teams": [None, True, 3],
+    }
+
+    assert serializers.stdlib_dumps(document) == serializers.orjson_dumps(document)
+
+
+def test_unknown_serializer_names_the_allowed_ones(monkeypatch):
+    monkeypatch.setenv("JSON_SERIALIZER", "ujson")
+
+    result = subprocess.run([sys.executable, "-c", "import app.serializers"], capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "ValueError: JSON_SERIALIZER must be one of json" in result.stderr